@@ -1,22 +1,77 @@
+import time
+_imports_started = time.perf_counter()
+
 from flask import Flask
 from extensions import db
 from blueprints.main import main_bp
 from blueprints.admin import admin_bp
 from blueprints.finance import finance_bp
+from database import engine_options, configure_sqlite, schema_lock
+import maintenance
+import backup
+import planner_cache
+import holiday_calendar
+import metrics
+import progress
 import os
 
-def create_app():
+# Tempo de importação do app (Flask, SQLAlchemy, models e blueprints)
+IMPORT_SECONDS = time.perf_counter() - _imports_started
+
+def create_app(config=None):
+    factory_started = time.perf_counter()
     app = Flask(__name__)
     
-    # Configurações
+    # Configurações (variáveis de ambiente PLANNER_* sobrescrevem os padrões)
     basedir = os.path.abspath(os.path.dirname(__file__))
     database_path = os.path.join(basedir, 'agenda.db')
+    env = os.environ.get
 
-    app.config['SECRET_KEY'] = 'agenda_controle_senha_hash24' 
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + database_path
+    app.config['SECRET_KEY'] = env('PLANNER_SECRET_KEY', 'agenda_controle_senha_hash24')
+    app.config['SQLALCHEMY_DATABASE_URI'] = env('PLANNER_DATABASE_URL', 'sqlite:///' + database_path)
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    # SQLite com vários workers: WAL + busy_timeout (ver database.py)
+    app.config['SQLITE_JOURNAL_MODE'] = env('PLANNER_SQLITE_JOURNAL_MODE', 'WAL')
+    app.config['SQLITE_SYNCHRONOUS'] = env('PLANNER_SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_BUSY_TIMEOUT'] = int(env('PLANNER_SQLITE_BUSY_TIMEOUT', 5000))
+    app.config['DB_POOL_SIZE'] = int(env('PLANNER_DB_POOL_SIZE', 5))
+    app.config['DB_MAX_OVERFLOW'] = int(env('PLANNER_DB_MAX_OVERFLOW', 10))
+    app.config['DB_POOL_TIMEOUT'] = int(env('PLANNER_DB_POOL_TIMEOUT', 30))
+
+    app.config['MAINTENANCE_INTERVAL'] = int(env('PLANNER_MAINTENANCE_INTERVAL', maintenance.DEFAULT_INTERVAL_SECONDS))
+    app.config['GENERATION_HORIZON_DAYS'] = int(env('PLANNER_HORIZON_DAYS', maintenance.DEFAULT_HORIZON_DAYS))
+
+    # Backups online (ver backup.py); intervalo 0 desliga o agendamento
+    app.config['BACKUP_DIR'] = env('PLANNER_BACKUP_DIR')
+    app.config['BACKUP_KEEP'] = int(env('PLANNER_BACKUP_KEEP', backup.DEFAULT_KEEP))
+    app.config['BACKUP_INTERVAL'] = int(env('PLANNER_BACKUP_INTERVAL', backup.DEFAULT_INTERVAL_SECONDS))
+
+    # Cache das semanas renderizadas do planner (0 desliga)
+    app.config['PLANNER_CACHE_SIZE'] = int(env('PLANNER_CACHE_SIZE', planner_cache.DEFAULT_CACHE_SIZE))
+    app.config['PLANNER_CACHE_BUCKET_SECONDS'] = int(env('PLANNER_CACHE_BUCKET_SECONDS', planner_cache.DEFAULT_BUCKET_SECONDS))
+
+    # PLANNER_METRICS=1 liga a instrumentação de SQL/latência e o /metrics (ver metrics.py)
+    app.config['METRICS_ENABLED'] = env('PLANNER_METRICS', '0') == '1'
+    app.config['QUERY_BUDGETS'] = {**metrics.DEFAULT_QUERY_BUDGETS, **metrics.parse_query_budgets(env('PLANNER_QUERY_BUDGETS'))}
+
+    # PLANNER_STARTUP_TIMING=1 imprime o tempo de cada etapa da inicialização
+    app.config['STARTUP_TIMING'] = env('PLANNER_STARTUP_TIMING', '0') == '1'
+
+    if config:
+        app.config.update(config)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+
     db.init_app(app)
+    configure_sqlite(app)
+
+    # Geração de eventos e conclusão automática em segundo plano
+    maintenance.init_app(app)
+    progress.init_app(app)
+    backup.init_app(app)
+    planner_cache.init_app(app)
+    holiday_calendar.init_app(app)
+    metrics.init_app(app)
 
     # Registrar Blueprints
     app.register_blueprint(main_bp)
@@ -35,17 +90,57 @@ def create_app():
         # Se não tiver, adiciona https://
         return 'https://' + url
 
+    schema_started = time.perf_counter()
     with app.app_context():
+        ensure_schema(app)
+        # Preenche os contadores de progresso das turmas na primeira execução
+        progress.ensure_progress_built()
+
+    finished = time.perf_counter()
+    app.extensions['startup_timings'] = {
+        'imports': IMPORT_SECONDS,
+        'app_factory': schema_started - factory_started,
+        'database_check': finished - schema_started,
+    }
+    if app.config['STARTUP_TIMING']:
+        print_startup_timings(app.extensions['startup_timings'])
+
+    return app
+
+def ensure_schema(app):
+    """
+    Cria tabelas e aplica colunas/índices novos, a não ser que o fingerprint do
+    esquema gravado no banco já seja o dos models (caso comum: nada a inspecionar).
+    """
+    from update_db import update_database, schema_fingerprint, read_schema_fingerprint
+
+    fingerprint = schema_fingerprint()
+    if read_schema_fingerprint() == fingerprint:
+        return
+
+    # Manutenção de esquema: um worker por vez (lock de arquivo ao lado do banco)
+    with schema_lock(app):
+        # Outro worker pode ter migrado enquanto este esperava o lock
+        if read_schema_fingerprint() == fingerprint:
+            return
         db.create_all()
-        
+
         # Verifica e atualiza a estrutura do banco de dados automaticamente
         try:
-            from update_db import update_database
             update_database(app)
         except Exception as e:
             print(f"Erro ao verificar atualizações do banco: {e}")
 
-    return app
+
+def print_startup_timings(timings):
+    total = sum(timings.values())
+    print("Tempo de inicialização:")
+    for step, seconds in timings.items():
+        print(f"  {step:<15} {seconds * 1000:8.1f} ms")
+    print(f"  {'total':<15} {total * 1000:8.1f} ms")
+
 
 if __name__ == '__main__':
-    app = create_app().run(debug=True, port=5000)
\ No newline at end of file
+    # Servidor de desenvolvimento. Em produção use o wsgi.py (ex: waitress/gunicorn)
+    debug = os.environ.get('PLANNER_DEBUG', '1') == '1'
+    app = create_app().run(debug=debug, port=int(os.environ.get('PORT', 5000)))
\ No newline at end of file
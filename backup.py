@@ -0,0 +1,178 @@
+import os
+import re
+import sqlite3
+from datetime import datetime, timedelta
+from extensions import db
+from database import sqlite_path, file_lock
+
+# Backup online do SQLite pela API de backup (sqlite3.Connection.backup): copia
+# N páginas por passo e solta o lock entre os passos, então a aplicação continua
+# gravando durante a cópia e o resultado é sempre um snapshot consistente
+# (diferente de copiar o arquivo com shutil enquanto há escritas).
+
+DEFAULT_PAGES_PER_STEP = 256
+DEFAULT_STEP_SLEEP = 0.01
+DEFAULT_KEEP = 7
+DEFAULT_INTERVAL_SECONDS = 24 * 60 * 60
+
+# agenda.db.20240101_120000.bak (backups com tag, ex. pre-migration, ficam fora do rodízio)
+_BACKUP_NAME = re.compile(r'^(?P<base>.+)\.(?P<stamp>\d{8}_\d{6})\.bak$')
+
+
+class BackupError(Exception):
+    pass
+
+
+def backup_dir(app):
+    path = sqlite_path(app)
+    return app.config.get('BACKUP_DIR') or os.path.dirname(os.path.abspath(path))
+
+
+def verify_backup(path):
+    """Roda PRAGMA integrity_check no arquivo; retorna a lista de problemas (vazia se ok)."""
+    conn = sqlite3.connect(path)
+    try:
+        rows = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+    finally:
+        conn.close()
+    return [] if rows == ['ok'] else rows
+
+
+def backup_database(app, tag=None, progress=None):
+    """
+    Gera um backup verificado do banco e retorna o caminho do arquivo.
+    A cópia é feita num arquivo temporário e só ganha o nome final depois
+    de passar no integrity_check.
+    """
+    source_path = sqlite_path(app)
+    if not source_path or source_path == ':memory:':
+        raise BackupError("Backup disponível apenas para banco SQLite em arquivo.")
+    source_path = os.path.abspath(source_path)
+    if not os.path.exists(source_path):
+        raise BackupError(f"Banco não encontrado: {source_path}")
+
+    target_dir = backup_dir(app)
+    os.makedirs(target_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    name = os.path.basename(source_path) + (f".{tag}" if tag else "") + f".{timestamp}.bak"
+    target_path = os.path.join(target_dir, name)
+    tmp_path = target_path + '.tmp'
+
+    source = sqlite3.connect(source_path, timeout=app.config.get('SQLITE_BUSY_TIMEOUT', 5000) / 1000)
+    target = sqlite3.connect(tmp_path)
+    try:
+        source.backup(target, pages=app.config.get('BACKUP_PAGES_PER_STEP', DEFAULT_PAGES_PER_STEP),
+                      progress=progress, sleep=app.config.get('BACKUP_STEP_SLEEP', DEFAULT_STEP_SLEEP))
+        # O backup herda o modo WAL da origem; volta para um arquivo único e autocontido
+        target.execute('PRAGMA journal_mode=DELETE')
+    except Exception:
+        target.close()
+        _remove(tmp_path)
+        raise
+    finally:
+        source.close()
+    target.close()
+
+    problems = verify_backup(tmp_path)
+    if problems:
+        _remove(tmp_path)
+        raise BackupError(f"Backup falhou no integrity_check: {'; '.join(problems[:5])}")
+
+    os.replace(tmp_path, target_path)
+    return target_path
+
+
+def list_backups(app):
+    """Backups do rodízio (sem tag), do mais novo para o mais antigo."""
+    base = os.path.basename(sqlite_path(app))
+    target_dir = backup_dir(app)
+    if not os.path.isdir(target_dir):
+        return []
+    backups = []
+    for name in os.listdir(target_dir):
+        match = _BACKUP_NAME.match(name)
+        if match and match.group('base') == base:
+            backups.append((match.group('stamp'), os.path.join(target_dir, name)))
+    return [path for stamp, path in sorted(backups, reverse=True)]
+
+
+def rotate_backups(app, keep=None):
+    """Apaga os backups do rodízio além dos `keep` mais recentes. Retorna os removidos."""
+    keep = app.config.get('BACKUP_KEEP', DEFAULT_KEEP) if keep is None else keep
+    removed = list_backups(app)[max(keep, 1):]
+    for path in removed:
+        _remove(path)
+    return removed
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _backup_due(interval):
+    from models import AppMeta
+    last = AppMeta.get('last_backup_at')
+    if not last:
+        return True
+    return datetime.now() - datetime.fromisoformat(last) >= timedelta(seconds=interval)
+
+
+def run_scheduled_backup(app):
+    """
+    Chamado pelo ciclo de manutenção: faz o backup se já passou BACKUP_INTERVAL
+    desde o último (marca d'água em AppMeta, compartilhada entre os workers).
+    Deve rodar dentro de um app_context. Retorna o caminho do backup ou None.
+    """
+    from models import AppMeta
+
+    interval = app.config.get('BACKUP_INTERVAL', DEFAULT_INTERVAL_SECONDS)
+    path = sqlite_path(app)
+    if interval <= 0 or not path or path == ':memory:' or not _backup_due(interval):
+        return None
+
+    # Só um worker faz o backup; os outros veem a marca d'água atualizada e desistem
+    with file_lock(os.path.abspath(path) + '.backup.lock'):
+        db.session.expire_all()
+        if not _backup_due(interval):
+            return None
+        backup_path = backup_database(app)
+        rotate_backups(app)
+        AppMeta.set('last_backup_at', datetime.now().isoformat(timespec='seconds'))
+        db.session.commit()
+    return backup_path
+
+
+def run_backup(app):
+    def report(status, remaining, total):
+        print(f"\r -> Copiando páginas: {total - remaining}/{total}", end='', flush=True)
+
+    path = backup_database(app, progress=report)
+    print(f"\n[Backup] Cópia verificada (integrity_check ok) em: {path}")
+    for removed in rotate_backups(app):
+        print(f" -> Backup antigo removido: {removed}")
+    with app.app_context():
+        from models import AppMeta
+        AppMeta.set('last_backup_at', datetime.now().isoformat(timespec='seconds'))
+        db.session.commit()
+    return path
+
+
+def init_app(app):
+    app.config.setdefault('BACKUP_DIR', None)
+    app.config.setdefault('BACKUP_KEEP', DEFAULT_KEEP)
+    app.config.setdefault('BACKUP_INTERVAL', DEFAULT_INTERVAL_SECONDS)
+    app.config.setdefault('BACKUP_PAGES_PER_STEP', DEFAULT_PAGES_PER_STEP)
+    app.config.setdefault('BACKUP_STEP_SLEEP', DEFAULT_STEP_SLEEP)
+
+    @app.cli.command('backup')
+    def backup_command():
+        """Faz um backup online verificado do banco e aplica o rodízio."""
+        run_backup(app)
+
+
+if __name__ == "__main__":
+    from app import create_app
+    run_backup(create_app())
@@ -0,0 +1,186 @@
+"""
+Micro-benchmarks dos caminhos quentes contra uma base sintética (seed_data.py).
+
+Cria um banco temporário, popula com o gerador e mede, N vezes cada:
+generate_events_for_period, check_auto_completion, calculate_end_date e as
+páginas do planner, finance.index e finance.conference pelo test client.
+Para cada caso registra tempos (min/mediana/média/máx, em ms) e o número de
+consultas SQL por execução, contadas pela instrumentação de metrics.py (ligada
+no app do benchmark; os tempos já incluem esse custo). O resultado vai para um
+JSON que pode ser comparado com o de outro commit (--compare).
+
+Uso:
+    python benchmark.py [--repeat 5] [--output bench.json] [--compare baseline.json]
+                        [--turmas 30 --years 3 ...  (opções do seed_data.py)]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from seed_data import seed_database, add_arguments, dataset_options
+
+
+def benchmark_cases(app):
+    """(nome, preparo, medição): o preparo roda fora da medição, ambos num app_context."""
+    from extensions import db
+    from models import Turma, CalendarEvent, AppMeta
+    from blueprints.main import generate_events_for_period, check_auto_completion
+    from blueprints.finance import calculate_end_date
+    from planner_cache import get_planner_cache
+
+    client = app.test_client()
+    horizon = {'days': app.config['GENERATION_HORIZON_DAYS']}
+
+    def extend_horizon():
+        # Cada execução estende a geração em mais uma semana (trabalho real, não só a marca d'água)
+        horizon['days'] += 7
+
+    def reopen_past_events():
+        # Volta as aulas concluídas automaticamente para 'scheduled' para a varredura ter o que fazer
+        CalendarEvent.query.filter(CalendarEvent.status == 'completed_auto').update(
+            {CalendarEvent.status: 'scheduled'}, synchronize_session=False)
+        AppMeta.query.filter(AppMeta.key == 'auto_completion_swept_at').delete()
+        db.session.commit()
+
+    def clear_planner_cache():
+        get_planner_cache(app).clear()
+
+    def get(path):
+        def run():
+            response = client.get(path() if callable(path) else path)
+            assert response.status_code == 200, f'{path}: HTTP {response.status_code}'
+        return run
+
+    today = datetime.today().date()
+    monday = today - timedelta(days=today.weekday())
+    next_week = f'/?date={(monday + timedelta(days=7)).isoformat()}'
+    # Semanas além do horizonte já gerado: cada execução abre uma semana nova (ensure_events_until gera)
+    far_week = {'start': monday + timedelta(weeks=app.config['GENERATION_HORIZON_DAYS'] // 7 + 1)}
+
+    def advance_far_week():
+        far_week['start'] += timedelta(weeks=1)
+
+    return [
+        ('generate_events_for_period', extend_horizon,
+         lambda: generate_events_for_period(datetime.today() + timedelta(days=horizon['days']))),
+        ('check_auto_completion', reopen_past_events, check_auto_completion),
+        ('calculate_end_date', None, lambda: [calculate_end_date(turma) for turma in Turma.query.all()]),
+        ('main.planner (cache vazio)', clear_planner_cache, get('/')),
+        ('main.planner', None, get('/')),
+        ('main.planner (semana seguinte)', clear_planner_cache, get(next_week)),
+        ('main.planner (além do horizonte)', advance_far_week,
+         get(lambda: f"/?date={far_week['start'].isoformat()}")),
+        ('finance.index', None, get('/finance/')),
+        ('finance.conference', None, get('/finance/conference')),
+    ]
+
+
+def run_benchmarks(app, repeat):
+    # Consultas contadas pelo hook de metrics.py (o app é criado com METRICS_ENABLED)
+    registry = app.extensions['metrics']
+
+    results = {}
+    for name, setup, measure in benchmark_cases(app):
+        timings = []
+        queries = []
+        for _ in range(repeat):
+            with app.app_context():
+                if setup:
+                    setup()
+                queries_before = registry.total_queries
+                start = time.perf_counter()
+                measure()
+                timings.append((time.perf_counter() - start) * 1000)
+                queries.append(registry.total_queries - queries_before)
+        results[name] = {
+            'runs': repeat,
+            'min_ms': round(min(timings), 3),
+            'median_ms': round(statistics.median(timings), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'max_ms': round(max(timings), 3),
+            'queries': round(statistics.median(queries)),
+        }
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    baseline_results = (baseline or {}).get('results', {})
+    header = f"{'caso':<32} {'mediana':>10} {'mín':>10} {'consultas':>10}"
+    if baseline:
+        header += f" {'antes':>10} {'variação':>9}"
+    print(header)
+    for name, result in results.items():
+        line = f"{name:<32} {result['median_ms']:>8.2f}ms {result['min_ms']:>8.2f}ms {result['queries']:>10}"
+        previous = baseline_results.get(name)
+        if previous:
+            change = (result['median_ms'] / previous['median_ms'] - 1) * 100 if previous['median_ms'] else 0.0
+            line += f" {previous['median_ms']:>8.2f}ms {change:>+8.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='execuções por caso')
+    parser.add_argument('--output', help='arquivo JSON para gravar o resultado')
+    parser.add_argument('--compare', help='JSON de uma execução anterior para comparar')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    tmpdir = tempfile.mkdtemp(prefix='planner_benchmark_')
+    try:
+        from app import create_app
+
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmpdir, 'agenda.db'),
+            'MAINTENANCE_INTERVAL': 0,
+            'BACKUP_INTERVAL': 0,
+            'METRICS_ENABLED': True,
+            'QUERY_BUDGETS': {},
+        })
+        seed_started = time.perf_counter()
+        counts = seed_database(app, **dataset_options(args))
+        print(f"Base sintética: {counts} ({time.perf_counter() - seed_started:.1f}s)")
+
+        report = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'dataset': {**dataset_options(args), 'rows': counts},
+            'results': run_benchmarks(app, args.repeat),
+        }
+        print_results(report['results'], baseline)
+
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            print(f"Resultado gravado em {args.output}")
+        return 0
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
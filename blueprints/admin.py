@@ -1,18 +1,59 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
-from extensions import db
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
+from extensions import db, chunked
 from models import Course, Turma, Lesson, CalendarEvent, Holiday, Student, StudentNote
-from datetime import datetime
+from progress import count_valid_from, refresh_turma_progress
+from holiday_calendar import add_holidays, remove_holidays, national_holidays
+from lessons import (iter_stream_lines, iter_numbered_titles, import_lesson_titles, summarize_import,
+                     bump_lessons_version, export_lessons, lessons_etag, EXPORT_MIMETYPES)
+from versions import bump_version, bump_versions, get_versions, version_key, make_etag, conditional_json
+from planner_cache import bump_planner_version
+from sqlalchemy import func, case, or_, and_
+from sqlalchemy.orm import joinedload
+from datetime import datetime, timedelta
 
 admin_bp = Blueprint('admin', __name__)
 
+TURMA_PAGE_SIZE = 20
+
+# Filtros da lista de turmas do painel
+TURMA_FILTERS = {
+    'all': None,
+    'active': Turma.active == True,
+    'graduated': Turma.status == 'graduated',
+}
+
 @admin_bp.route('/')
 def index():
-    courses = Course.query.all()
-    turmas = Turma.query.all()
-    # Ordena as lições para exibição
-    for c in courses:
-        c.lessons.sort(key=lambda x: x.order)
-    return render_template('admin/index.html', courses=courses, turmas=turmas)
+    # Número fixo de consultas: cursos, contagens por filtro e a página de turmas
+    # (com o curso via JOIN). As aulas de cada curso são buscadas sob demanda
+    # pelo modal do curso (api_get_lessons).
+    courses = Course.query.order_by(Course.id).all()
+
+    turma_filter = request.args.get('status', 'all')
+    if turma_filter not in TURMA_FILTERS:
+        turma_filter = 'all'
+
+    total, active, graduated = db.session.query(
+        func.count(Turma.id),
+        func.sum(case((TURMA_FILTERS['active'], 1), else_=0)),
+        func.sum(case((TURMA_FILTERS['graduated'], 1), else_=0))
+    ).one()
+    turma_counts = {'all': total, 'active': active or 0, 'graduated': graduated or 0}
+
+    per_page = request.args.get('per_page', TURMA_PAGE_SIZE, type=int)
+    if per_page <= 0:
+        per_page = TURMA_PAGE_SIZE
+    total_pages = max(1, -(-turma_counts[turma_filter] // per_page))
+    page = min(max(request.args.get('page', 1, type=int), 1), total_pages)
+
+    turmas_query = Turma.query.options(joinedload(Turma.course))
+    if TURMA_FILTERS[turma_filter] is not None:
+        turmas_query = turmas_query.filter(TURMA_FILTERS[turma_filter])
+    turmas = turmas_query.order_by(Turma.id).limit(per_page).offset((page - 1) * per_page).all()
+
+    return render_template('admin/index.html', courses=courses, turmas=turmas,
+                           turma_filter=turma_filter, turma_counts=turma_counts,
+                           page=page, per_page=per_page, total_pages=total_pages)
 
 @admin_bp.route('/save_course', methods=['POST'])
 def save_course():
@@ -31,6 +72,8 @@ def save_course():
     course.duration_minutes = int(duration) if duration else 60
     course.price_per_class = float(price) if price else 0.0
     
+    db.session.flush()
+    bump_version('course', course.id)
     db.session.commit()
     flash('Curso salvo com sucesso!', 'success')
     return redirect(url_for('admin.index'))
@@ -52,6 +95,7 @@ def api_update_lesson():
     elif field == 'title':
         lesson.title = value
         
+    bump_lessons_version(lesson.course_id)
     db.session.commit()
     return jsonify({'success': True})
 
@@ -61,26 +105,12 @@ def api_import_lessons(course_id):
     file = request.files.get('lessons_file')
     
     if file:
-        content = file.read().decode('utf-8')
-        lines = content.split('\n')
-        
-        # Pega a última ordem existente para adicionar no final
-        last_lesson = Lesson.query.filter_by(course_id=course_id).order_by(Lesson.order.desc()).first()
-        current_order = last_lesson.order + 1 if last_lesson else 0
-        
-        added_count = 0
-        for line in lines:
-            if line.strip():
-                lesson = Lesson(
-                    course_id=course.id,
-                    title=line.strip(),
-                    order=current_order
-                )
-                db.session.add(lesson)
-                current_order += 1
-                added_count += 1
+        # Lê o upload em blocos e insere em lote, sem montar a lista de linhas em memória
+        progress = import_lesson_titles(course.id, iter_stream_lines(file.stream))
         db.session.commit()
-        return jsonify({'success': True, 'message': f'{added_count} aulas importadas!', 'course_id': course.id})
+        imported, skipped = summarize_import(progress)
+        return jsonify({'success': True, 'message': import_message(imported, skipped, 'importadas!'),
+                        'course_id': course.id, 'imported': imported, 'skipped': skipped, 'progress': progress})
     
     return jsonify({'success': False, 'message': 'Arquivo inválido'})
 
@@ -88,33 +118,29 @@ def api_import_lessons(course_id):
 @admin_bp.route('/api/import_lessons_raw/<int:course_id>', methods=['POST'])
 def api_import_lessons_raw(course_id):
     course = Course.query.get_or_404(course_id)
-    data = request.json
-    content = data.get('raw_text', '')
     
-    # Divide o texto em linhas, removendo espaços e ignorando linhas totalmente vazias
-    lines = [line.strip() for line in content.split('\n') if line.strip()]
+    # Texto puro no corpo é lido como stream; JSON {'raw_text': ...} continua aceito
+    if request.mimetype == 'text/plain':
+        lines = iter_stream_lines(request.stream)
+    else:
+        data = request.get_json(silent=True) or {}
+        lines = (line.strip() for line in data.get('raw_text', '').split('\n') if line.strip())
     
-    titles = []
-    # Percorre procurando linhas compostas unicamente por números (índice da aula)
-    for i, line in enumerate(lines):
-        if line.isdigit():
-            # A linha imediatamente abaixo será assumida como o título da aula
-            if i + 1 < len(lines):
-                titles.append(lines[i+1])
-                
-    if not titles:
+    # Linhas compostas só por números (índice da aula): a linha seguinte é o título
+    progress = import_lesson_titles(course.id, iter_numbered_titles(lines))
+    imported, skipped = summarize_import(progress)
+    if not imported and not skipped:
         return jsonify({'success': False, 'message': 'Nenhuma aula (padrão numérico) encontrada no texto.'})
 
-    last_lesson = Lesson.query.filter_by(course_id=course_id).order_by(Lesson.order.desc()).first()
-    current_order = last_lesson.order + 1 if last_lesson else 0
-    
-    for title in titles:
-        lesson = Lesson(course_id=course.id, title=title, order=current_order)
-        db.session.add(lesson)
-        current_order += 1
-        
     db.session.commit()
-    return jsonify({'success': True, 'message': f'{len(titles)} aulas extraídas e importadas com sucesso!', 'course_id': course.id})
+    return jsonify({'success': True, 'message': import_message(imported, skipped, 'extraídas e importadas com sucesso!'),
+                    'course_id': course.id, 'imported': imported, 'skipped': skipped, 'progress': progress})
+
+def import_message(imported, skipped, suffix):
+    message = f'{imported} aulas {suffix}'
+    if skipped:
+        message += f' ({skipped} já existentes ignoradas)'
+    return message
 
 # NOVO: Adicionar aula manualmente
 @admin_bp.route('/api/add_lesson_manual', methods=['POST'])
@@ -128,6 +154,7 @@ def api_add_lesson_manual():
     
     lesson = Lesson(course_id=course_id, title=title, order=current_order)
     db.session.add(lesson)
+    bump_lessons_version(course_id)
     db.session.commit()
     
     return jsonify({'success': True})
@@ -135,14 +162,17 @@ def api_add_lesson_manual():
 # NOVO: API para buscar as aulas (para atualizar a lista via JS)
 @admin_bp.route('/api/get_lessons/<int:course_id>')
 def api_get_lessons(course_id):
-    lessons = Lesson.query.filter_by(course_id=course_id).order_by(Lesson.order).all()
-    lessons_data = [{
-        'id': l.id, 
-        'title': l.title, 
-        'link_p': l.link_presentation, 
-        'link_g': l.link_guide
-    } for l in lessons]
-    return jsonify(lessons_data)
+    def build():
+        lessons = Lesson.query.filter_by(course_id=course_id).order_by(Lesson.order).all()
+        return [{
+            'id': l.id, 
+            'title': l.title, 
+            'link_p': l.link_presentation, 
+            'link_g': l.link_guide
+        } for l in lessons]
+
+    version, = get_versions(version_key('course', course_id))
+    return conditional_json(make_etag('get_lessons', course_id, version), build)
 
 # NOVO: Remover Lição
 @admin_bp.route('/delete_lesson/<int:lesson_id>')
@@ -150,6 +180,7 @@ def delete_lesson(lesson_id):
     lesson = Lesson.query.get_or_404(lesson_id)
     course_id = lesson.course_id
     db.session.delete(lesson)
+    bump_lessons_version(course_id)
     db.session.commit()
     # Se a chamada for via AJAX, deveria retornar JSON, mas para simplificar
     # vamos assumir redirecionamento ou uso da API de listagem
@@ -160,6 +191,7 @@ def delete_lesson(lesson_id):
 def api_delete_lesson(lesson_id):
     lesson = Lesson.query.get_or_404(lesson_id)
     db.session.delete(lesson)
+    bump_lessons_version(lesson.course_id)
     db.session.commit()
     return jsonify({'success': True})
 
@@ -170,6 +202,7 @@ def api_delete_all_lessons(course_id):
     try:
         # Usamos .delete() que é otimizado para apagar múltiplos registros
         num_deleted = Lesson.query.filter_by(course_id=course_id).delete()
+        bump_lessons_version(course_id)
         db.session.commit()
         return jsonify({'success': True, 'message': f'{num_deleted} aulas foram apagadas com sucesso.'})
     except Exception as e:
@@ -181,24 +214,37 @@ def api_delete_all_lessons(course_id):
 @admin_bp.route('/api/export_lessons_raw/<int:course_id>')
 def api_export_lessons_raw(course_id):
     course = Course.query.get_or_404(course_id)
-    # Garante que as aulas estão ordenadas corretamente para a numeração sequencial
-    lessons = Lesson.query.filter_by(course_id=course_id).order_by(Lesson.order).all()
+    raw_text = "".join(export_lessons(course.id, 'text'))
 
-    if not lessons:
+    if not raw_text:
         return jsonify({'success': False, 'message': 'Este curso não tem aulas para exportar.'})
 
-    output_lines = []
-    for i, lesson in enumerate(lessons, 1): # Começa a contagem do 1
-        output_lines.append(str(i))
-        output_lines.append(lesson.title)
-        # Placeholders para manter o formato de 6 linhas que o usuário espera
-        output_lines.append("Professor(a)") 
-        output_lines.append("YYYY-MM-DD HH:MM")
-        output_lines.append("Dia")
-        output_lines.append("Gravações da aula")
-        output_lines.append("") # Linha em branco entre os blocos
+    return jsonify({'success': True, 'raw_text': raw_text})
+
+# Exportação em stream (?format=text|ndjson|csv) com ETag: se as aulas do curso
+# não mudaram desde a última exportação, responde 304 sem ler curso nem aulas
+@admin_bp.route('/api/export_lessons/<int:course_id>')
+def api_export_lessons(course_id):
+    export_format = request.args.get('format', 'text')
+    if export_format not in EXPORT_MIMETYPES:
+        return jsonify({'success': False, 'message': 'Formato inválido (use text, ndjson ou csv).'}), 400
 
-    return jsonify({'success': True, 'raw_text': "\n".join(output_lines)})
+    etag = lessons_etag(course_id, export_format)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        course = Course.query.get_or_404(course_id)
+        if not db.session.query(Lesson.query.filter_by(course_id=course.id).exists()).scalar():
+            return jsonify({'success': False, 'message': 'Este curso não tem aulas para exportar.'}), 404
+        response = Response(stream_with_context(export_lessons(course.id, export_format)),
+                            mimetype=EXPORT_MIMETYPES[export_format])
+        if export_format == 'csv':
+            response.headers['Content-Disposition'] = f'attachment; filename=aulas_curso_{course.id}.csv'
+
+    response.set_etag(etag)
+    # O navegador sempre revalida (If-None-Match) antes de reaproveitar a cópia
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 # --- MANTENHA AS OUTRAS ROTAS (save_class, add_holiday, etc) IGUAIS ---
 # (Copie as rotas save_class, add_holiday, delete_holiday, add_replacement, add_extra do seu arquivo anterior)
@@ -237,7 +283,12 @@ def save_class():
     # Se reativar, volta status
     if turma.active and turma.status == 'graduated':
         turma.status = 'active'
+    # Dias/limites podem ter mudado: reavalia a geração de eventos desta turma
+    turma.generated_until = None
 
+    db.session.flush()
+    bump_version('turma', turma.id)
+    bump_planner_version()
     db.session.commit()
     flash('Turma salva com sucesso!', 'success')
     return redirect(url_for('admin.index'))
@@ -248,26 +299,85 @@ def add_holiday():
     name = request.form.get('name')
     if date_str and name:
         date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
-        holiday = Holiday(date=date_obj, name=name)
-        db.session.add(holiday)
-        events_on_date = CalendarEvent.query.filter_by(date=date_obj).all()
-        for event in events_on_date:
-            event.status = 'holiday' 
-        db.session.commit()
-        flash(f'Feriado "{name}" adicionado.', 'success')
+        if add_holidays([(date_obj, name)]):
+            db.session.commit()
+            flash(f'Feriado "{name}" adicionado.', 'success')
+        else:
+            flash('Já existe um feriado cadastrado nesta data.', 'warning')
+    return redirect(url_for('main.planner'))
+
+def parse_holiday_list(text, default_name):
+    """
+    Lê uma lista colada de feriados, um por linha: "AAAA-MM-DD Nome" ou "DD/MM/AAAA Nome".
+    Linhas sem nome usam default_name. Retorna (lista [(data, nome)], linhas inválidas).
+    """
+    entries, invalid = [], []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        date_part, _, name = line.partition(' ')
+        for fmt in ('%Y-%m-%d', '%d/%m/%Y'):
+            try:
+                entries.append((datetime.strptime(date_part, fmt).date(), name.strip(' -') or default_name))
+                break
+            except ValueError:
+                continue
+        else:
+            invalid.append(line)
+    return entries, invalid
+
+# NOVO: Importação de feriados em lote (intervalo, lista colada ou nacionais do ano)
+@admin_bp.route('/import_holidays', methods=['POST'])
+def import_holidays():
+    mode = request.form.get('mode')
+    name = (request.form.get('name') or '').strip() or 'Feriado'
+    entries, invalid = [], []
+
+    try:
+        if mode == 'range':
+            start = datetime.strptime(request.form.get('start_date'), '%Y-%m-%d').date()
+            end = datetime.strptime(request.form.get('end_date'), '%Y-%m-%d').date()
+            entries = [(start + timedelta(days=i), name) for i in range((end - start).days + 1)]
+        elif mode == 'list':
+            entries, invalid = parse_holiday_list(request.form.get('dates_text', ''), name)
+        elif mode == 'national':
+            entries = national_holidays(int(request.form.get('year')))
+    except (TypeError, ValueError):
+        flash('Dados de importação inválidos.', 'danger')
+        return redirect(url_for('main.planner'))
+
+    added = add_holidays(entries)
+    db.session.commit()
+    flash(f'{len(added)} feriado(s) importado(s), {len(entries) - len(added)} já existente(s).', 'success')
+    if invalid:
+        flash(f'Linhas ignoradas: {", ".join(invalid)}', 'warning')
     return redirect(url_for('main.planner'))
 
 @admin_bp.route('/delete_holiday/<int:id>')
 def delete_holiday(id):
     holiday = Holiday.query.get_or_404(id)
-    events = CalendarEvent.query.filter_by(date=holiday.date, status='holiday').all()
-    for event in events:
-        event.status = 'scheduled'
-    db.session.delete(holiday)
+    remove_holidays([holiday])
     db.session.commit()
     flash(f'Feriado removido.', 'info')
     return redirect(url_for('main.planner'))
 
+# NOVO: Remover todos os feriados de um intervalo (ex.: desfazer um recesso importado)
+@admin_bp.route('/delete_holidays_range', methods=['POST'])
+def delete_holidays_range():
+    try:
+        start = datetime.strptime(request.form.get('start_date'), '%Y-%m-%d').date()
+        end = datetime.strptime(request.form.get('end_date'), '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        flash('Intervalo inválido.', 'danger')
+        return redirect(url_for('main.planner'))
+
+    holidays = Holiday.query.filter(Holiday.date >= start, Holiday.date <= end).all()
+    removed = remove_holidays(holidays)
+    db.session.commit()
+    flash(f'{len(removed)} feriado(s) removido(s).', 'info')
+    return redirect(url_for('main.planner'))
+
 @admin_bp.route('/add_replacement', methods=['POST'])
 def add_replacement():
     try:
@@ -283,6 +393,7 @@ def add_replacement():
             student_name=student_name, extra_link=link_backoffice
         )
         db.session.add(event)
+        bump_planner_version()
         db.session.commit()
         flash('Reposição agendada!', 'success')
     except Exception as e:
@@ -307,7 +418,10 @@ def add_extra():
             event.extra_link = request.form.get('link_backoffice') 
         else:
             event.turma_id = int(turma_id_raw)
+            Turma.query.filter_by(id=event.turma_id).update({Turma.generated_until: None})
         db.session.add(event)
+        refresh_turma_progress([event.turma_id])
+        bump_planner_version()
         db.session.commit()
         flash('Aula extra agendada!', 'success')
     except Exception as e:
@@ -317,8 +431,12 @@ def add_extra():
 #API para buscar dados da turma para edição
 @admin_bp.route('/api/get_class/<int:class_id>')
 def api_get_class(class_id):
+    version, = get_versions(version_key('turma', class_id))
+    return conditional_json(make_etag('get_class', class_id, version), lambda: class_to_json(class_id))
+
+def class_to_json(class_id):
     turma = Turma.query.get_or_404(class_id)
-    return jsonify({
+    return {
         'id': turma.id,
         'name': turma.name,
         'course_id': turma.course_id,
@@ -332,7 +450,7 @@ def api_get_class(class_id):
         'link_backoffice': turma.link_backoffice or '',
         'link_whatsapp': turma.link_whatsapp or '',
         'link_extra': turma.link_extra or ''
-    })
+    }
 
 # --- GESTÃO DE ALUNOS ---
 
@@ -352,28 +470,122 @@ def api_save_student():
         student = Student(turma_id=turma_id, name=name, phone=phone)
         db.session.add(student)
     
+    bump_version('roster', student.turma_id)
     db.session.commit()
     return jsonify({'success': True})
 
+# --- ROSTER DE ALUNOS E NOTAS ---
+
+NOTES_PREVIEW = 5
+NOTES_PAGE_SIZE = 20
+
+def note_to_json(note_id, note_date, content):
+    return {'id': note_id, 'date': note_date.strftime('%d/%m/%Y') if note_date else '', 'content': content}
+
+def get_rosters(turma_ids, notes_limit=NOTES_PREVIEW):
+    """
+    Alunos das turmas com as `notes_limit` notas mais recentes de cada um e o total
+    de notas. Duas consultas por bloco de turmas (alunos + notas ranqueadas por
+    ROW_NUMBER), independente de quantos alunos existem. Retorna {turma_id: [alunos]}.
+    """
+    rosters = {turma_id: [] for turma_id in turma_ids}
+    for chunk in chunked(turma_ids):
+        students = {}
+        for s in Student.query.filter(Student.turma_id.in_(chunk)).order_by(Student.id):
+            students[s.id] = {'id': s.id, 'name': s.name, 'phone': s.phone or '', 'active': s.active,
+                              'notes': [], 'notes_total': 0}
+            rosters[s.turma_id].append(students[s.id])
+        if not students:
+            continue
+
+        ranked = db.session.query(
+            StudentNote.id, StudentNote.student_id, StudentNote.date, StudentNote.content,
+            func.row_number().over(partition_by=StudentNote.student_id,
+                                   order_by=(StudentNote.date.desc(), StudentNote.id.desc())).label('position'),
+            func.count(StudentNote.id).over(partition_by=StudentNote.student_id).label('total')
+        ).join(Student, Student.id == StudentNote.student_id).filter(Student.turma_id.in_(chunk)).subquery()
+
+        # Pelo menos a 1ª nota de cada aluno vem, para preencher o total mesmo com notes_limit=0
+        for row in db.session.query(ranked).filter(ranked.c.position <= max(notes_limit, 1)).order_by(
+                ranked.c.student_id, ranked.c.position):
+            student = students[row.student_id]
+            student['notes_total'] = row.total
+            if row.position <= notes_limit:
+                student['notes'].append(note_to_json(row.id, row.date, row.content))
+    return rosters
+
+def read_notes_limit():
+    return min(max(request.args.get('notes', NOTES_PREVIEW, type=int), 0), 100)
+
 @admin_bp.route('/api/get_students/<int:turma_id>')
 def api_get_students(turma_id):
-    students = Student.query.filter_by(turma_id=turma_id).all()
-    result = []
-    for s in students:
-        notes = [{'date': n.date.strftime('%d/%m/%Y'), 'content': n.content} for n in s.notes]
-        result.append({
-            'id': s.id,
-            'name': s.name,
-            'phone': s.phone or '',
-            'active': s.active,
-            'notes': notes
-        })
-    return jsonify(result)
+    notes_limit = read_notes_limit()
+    version, = get_versions(version_key('roster', turma_id))
+    return conditional_json(make_etag('get_students', turma_id, version, notes_limit),
+                            lambda: get_rosters([turma_id], notes_limit)[turma_id])
+
+# NOVO: Rosters de várias turmas numa chamada (?turma_ids=1,2,3)
+@admin_bp.route('/api/get_students')
+def api_get_students_multi():
+    try:
+        turma_ids = sorted({int(tid) for tid in request.args.get('turma_ids', '').split(',') if tid.strip()})
+    except ValueError:
+        return jsonify({'success': False, 'message': 'turma_ids inválido'}), 400
+
+    notes_limit = read_notes_limit()
+
+    def build():
+        rosters = get_rosters(turma_ids, notes_limit)
+        return {'success': True, 'rosters': {str(turma_id): students for turma_id, students in rosters.items()}}
+
+    versions = get_versions(*(version_key('roster', turma_id) for turma_id in turma_ids))
+    return conditional_json(make_etag('get_students', turma_ids, versions, notes_limit), build)
+
+# NOVO: Histórico de notas do aluno, paginado por keyset em (date, id), mais recentes primeiro
+@admin_bp.route('/api/get_student_notes/<int:student_id>')
+def api_get_student_notes(student_id):
+    before_date = request.args.get('before_date')
+    before_id = request.args.get('before_id', type=int)
+    limit = min(max(request.args.get('limit', NOTES_PAGE_SIZE, type=int), 1), 200)
+
+    # Cursor (before_date, before_id): os dois juntos, ou nenhum
+    cursor_date = None
+    if before_date or 'before_id' in request.args:
+        try:
+            cursor_date = datetime.fromisoformat(before_date or '')
+        except ValueError:
+            pass
+        if cursor_date is None or before_id is None:
+            return jsonify({'success': False, 'message': 'Cursor inválido'}), 400
+
+    def build():
+        query = db.session.query(StudentNote.id, StudentNote.date, StudentNote.content).filter(
+            StudentNote.student_id == student_id)
+        if cursor_date is not None:
+            query = query.filter(or_(
+                StudentNote.date < cursor_date,
+                and_(StudentNote.date == cursor_date, StudentNote.id < before_id)
+            ))
+        notes = query.order_by(StudentNote.date.desc(), StudentNote.id.desc()).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(notes) > limit:
+            notes = notes[:limit]
+            next_cursor = {'before_date': notes[-1].date.isoformat(), 'before_id': notes[-1].id}
+        return {
+            'success': True,
+            'notes': [note_to_json(*note) for note in notes],
+            'next_cursor': next_cursor
+        }
+
+    version, = get_versions(version_key('student', student_id))
+    return conditional_json(make_etag('get_student_notes', student_id, version, before_date, before_id, limit), build)
 
 @admin_bp.route('/api/toggle_student/<int:student_id>', methods=['POST'])
 def api_toggle_student(student_id):
     student = Student.query.get_or_404(student_id)
     student.active = not student.active
+    bump_version('roster', student.turma_id)
     db.session.commit()
     return jsonify({'success': True, 'active': student.active})
 
@@ -385,15 +597,19 @@ def api_add_student_note():
     
     note = StudentNote(student_id=student_id, content=content)
     db.session.add(note)
+    # A prévia do roster mostra as últimas notas: invalida o aluno e a turma dele
+    bump_version('student', student_id)
+    bump_versions('roster', [tid for (tid,) in db.session.query(Student.turma_id).filter(Student.id == student_id)])
     db.session.commit()
     return jsonify({'success': True})
 
 # --- AJUSTE DE PROGRESSO DA TURMA ---
 
-@admin_bp.route('/api/get_class_progress/<int:class_id>')
-def api_get_class_progress(class_id):
-    turma = Turma.query.get_or_404(class_id)
-    
+def valid_count_before_next_class(turma):
+    """
+    Aulas válidas antes da "próxima aula" real (hoje ou futuro) da turma.
+    Lê o contador Turma.valid_count e desconta só as aulas válidas a partir da data de corte.
+    """
     # CORREÇÃO: Identifica a "próxima aula" real (hoje ou futuro) para alinhar a contagem
     next_event = CalendarEvent.query.filter(
         CalendarEvent.turma_id == turma.id,
@@ -404,13 +620,20 @@ def api_get_class_progress(class_id):
     # Define a data de corte: se tiver aula futura, conta até antes dela. Se não, conta tudo até hoje.
     cutoff_date = next_event.date if next_event else datetime.now().date()
     
-    valid_count = CalendarEvent.query.filter(
-        CalendarEvent.turma_id == turma.id,
-        CalendarEvent.status.notin_(['cancelled', 'holiday']),
-        CalendarEvent.is_extra == False,
-        CalendarEvent.is_replacement == False,
-        CalendarEvent.date < cutoff_date
-    ).count()
+    from_cutoff = count_valid_from([turma.id], cutoff_date).get(turma.id, 0)
+    return (turma.valid_count or 0) - from_cutoff
+
+@admin_bp.route('/api/get_class_progress/<int:class_id>')
+def api_get_class_progress(class_id):
+    # A "próxima aula" depende também dos feriados e do dia de hoje
+    version, holidays_version = get_versions(version_key('turma', class_id), 'holidays_version')
+    etag = make_etag('get_class_progress', class_id, version, holidays_version, datetime.now().date())
+    return conditional_json(etag, lambda: class_progress_to_json(class_id))
+
+def class_progress_to_json(class_id):
+    turma = Turma.query.get_or_404(class_id)
+    
+    valid_count = valid_count_before_next_class(turma)
     
     # Próxima aula calculada (1-based para exibição)
     current_next_lesson = valid_count + turma.lesson_offset + 1
@@ -421,13 +644,13 @@ def api_get_class_progress(class_id):
         course_lessons = [{'order': l.order, 'title': l.title} for l in turma.course.lessons]
         course_lessons.sort(key=lambda x: x['order'])
         
-    return jsonify({
+    return {
         'class_id': turma.id,
         'class_name': turma.name,
         'valid_count': valid_count,
         'current_next_lesson': current_next_lesson,
         'course_lessons': course_lessons
-    })
+    }
 
 @admin_bp.route('/api/adjust_class_progress', methods=['POST'])
 def api_adjust_class_progress():
@@ -436,24 +659,13 @@ def api_adjust_class_progress():
     target_lesson = int(data.get('target_lesson')) # Número da aula que o usuário QUER (1-based)
     
     # CORREÇÃO: Mesma lógica do GET para garantir consistência
-    next_event = CalendarEvent.query.filter(
-        CalendarEvent.turma_id == turma.id,
-        CalendarEvent.status.notin_(['cancelled', 'holiday']),
-        CalendarEvent.date >= datetime.now().date()
-    ).order_by(CalendarEvent.date).first()
-    
-    cutoff_date = next_event.date if next_event else datetime.now().date()
-    
-    valid_count = CalendarEvent.query.filter(
-        CalendarEvent.turma_id == turma.id,
-        CalendarEvent.status.notin_(['cancelled', 'holiday']),
-        CalendarEvent.is_extra == False,
-        CalendarEvent.is_replacement == False,
-        CalendarEvent.date < cutoff_date
-    ).count()
+    valid_count = valid_count_before_next_class(turma)
     
     # Fórmula: target = valid + offset + 1  =>  offset = target - valid - 1
     turma.lesson_offset = target_lesson - valid_count - 1
+    turma.generated_until = None
+    bump_version('turma', turma.id)
+    bump_planner_version()
     db.session.commit()
     
     return jsonify({'success': True})
\ No newline at end of file
@@ -1,72 +1,83 @@
 from flask import Blueprint, render_template, request, jsonify
-from extensions import db
-from models import CalendarEvent, Turma, Holiday
-from sqlalchemy import func
+from extensions import db, chunked
+from models import CalendarEvent, Turma
+from progress import count_valid_from
+from holiday_calendar import get_holiday_calendar
+from sqlalchemy import func, case, and_, or_
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
 from calendar import monthrange
 
 finance_bp = Blueprint('finance', __name__)
 
-# --- FUNÇÃO DE CÁLCULO DE TÉRMINO ---
-def calculate_end_date(turma):
+# --- FUNÇÕES DE CÁLCULO DE TÉRMINO ---
+def nth_class_day(start, n, weekdays):
+    """Data da n-ésima (1-based) aula a partir de start (inclusive), sem considerar feriados."""
+    offsets = sorted((wd - start.weekday()) % 7 for wd in weekdays)
+    full_weeks, index = divmod(n - 1, len(offsets))
+    return start + timedelta(days=offsets[index] + 7 * full_weeks)
+
+
+def project_end_date(start, remaining, weekdays, holidays):
     """
-    Calcula a data prevista para o fim das aulas.
-    Lógica: Conta aulas válidas no banco + Projeta as faltantes ignorando feriados.
+    Projeta a data da última aula de forma fechada: calcula a data da aula
+    `remaining` pela cadência semanal e corrige pelos feriados que caem em dias de aula
+    (bisect no calendário de feriados), repetindo só para o saldo de feriados.
     """
-    if not turma.active:
-        return "Concluído/Inativo"
+    current = start
+    while True:
+        candidate = nth_class_day(current, remaining, weekdays)
+        skipped = sum(1 for h in holidays.between(current, candidate) if h.weekday() in weekdays)
+        if not skipped:
+            return candidate
+        current = candidate + timedelta(days=1)
+        remaining = skipped
 
-    # 1. Conta quantas aulas válidas (não canceladas/feriado) JÁ EXISTEM no banco
-    valid_count = CalendarEvent.query.filter(
-        CalendarEvent.turma_id == turma.id,
-        CalendarEvent.status.notin_(['cancelled', 'holiday']),
-        CalendarEvent.is_extra == False,
-        CalendarEvent.is_replacement == False
-    ).count()
-
-    # CORREÇÃO: Considera o offset (aulas puladas ou repetidas) no cálculo de restantes
-    # Se offset for positivo (pulou aulas), faltam menos. Se negativo (repetiu), faltam mais.
-    remaining = turma.total_classes - (valid_count + turma.lesson_offset)
-
-    # Se já atingiu o total, a última aula válida é a data final
-    if remaining <= 0:
-        last_event = CalendarEvent.query.filter(
-            CalendarEvent.turma_id == turma.id,
-            CalendarEvent.status.notin_(['cancelled', 'holiday'])
-        ).order_by(CalendarEvent.date.desc()).first()
-        return last_event.date.strftime('%d/%m/%Y') if last_event else "Concluído"
-
-    # 2. Se faltam aulas, vamos PROJETAR a partir da última aula registrada
-    last_registered_event = CalendarEvent.query.filter_by(turma_id=turma.id)\
-        .order_by(CalendarEvent.date.desc()).first()
-    
-    # Começa a contar do dia seguinte à última aula (ou da data de início se não houver aulas)
-    if last_registered_event:
-        current_date = last_registered_event.date + timedelta(days=1)
-    elif turma.start_date:
-        current_date = turma.start_date
-    else:
-        current_date = datetime.today().date()
 
-    # Prepara dados para o loop
-    holidays = {h.date for h in Holiday.query.all()}
-    if not turma.schedule_days:
-        return "Sem dias definidos"
-        
-    schedule_days = [int(d) for d in turma.schedule_days.split(',')]
-    
-    # Loop de projeção (Simula o calendário)
-    while remaining > 0:
-        # Se for dia de aula E não for feriado, desconta 1
-        if current_date.weekday() in schedule_days:
-            if current_date not in holidays:
-                remaining -= 1
-        
-        # Se ainda faltar, avança para o próximo dia, a menos que tenhamos acabado de descontar o último
-        if remaining > 0:
-            current_date += timedelta(days=1)
+def calculate_end_dates(turmas):
+    """
+    Calcula a data prevista para o fim das aulas de várias turmas de uma vez.
+    Lógica: Aulas válidas (contadores da Turma) + Projeta as faltantes ignorando feriados.
+    Feriados são carregados uma vez; o custo não depende do nº de aulas.
+    """
+    holidays = get_holiday_calendar()
+
+    end_dates = {}
+    for turma in turmas:
+        if not turma.active:
+            end_dates[turma.id] = "Concluído/Inativo"
+            continue
+
+        # CORREÇÃO: Considera o offset (aulas puladas ou repetidas) no cálculo de restantes
+        # Se offset for positivo (pulou aulas), faltam menos. Se negativo (repetiu), faltam mais.
+        remaining = turma.total_classes - ((turma.valid_count or 0) + turma.lesson_offset)
+
+        # Se já atingiu o total, a última aula válida é a data final
+        if remaining <= 0:
+            last_valid = turma.last_valid_date
+            end_dates[turma.id] = last_valid.strftime('%d/%m/%Y') if last_valid else "Concluído"
+            continue
+
+        # Começa a contar do dia seguinte à última aula (ou da data de início se não houver aulas)
+        if turma.last_event_date:
+            current_date = turma.last_event_date + timedelta(days=1)
+        elif turma.start_date:
+            current_date = turma.start_date
+        else:
+            current_date = datetime.today().date()
+
+        weekdays = {int(d) for d in turma.schedule_days.split(',')} & set(range(7)) if turma.schedule_days else set()
+        if not weekdays:
+            end_dates[turma.id] = "Sem dias definidos"
+            continue
+
+        end_dates[turma.id] = project_end_date(current_date, remaining, weekdays, holidays).strftime('%d/%m/%Y')
+    return end_dates
+
 
-    return current_date.strftime('%d/%m/%Y')
+def calculate_end_date(turma):
+    """Atalho para uma única turma (ver calculate_end_dates)."""
+    return calculate_end_dates([turma])[turma.id]
 
 @finance_bp.route('/')
 def index():
@@ -76,42 +87,54 @@ def index():
     selected_year = request.args.get('year', today.year, type=int)
     period = request.args.get('period', 'all') 
 
-    # --- LÓGICA DO EXTRATO (Mantida igual) ---
-    query = CalendarEvent.query.filter(CalendarEvent.status != 'cancelled')
-    query = query.filter(func.strftime('%Y', CalendarEvent.date) == str(selected_year))
-    query = query.filter(func.strftime('%m', CalendarEvent.date) == f'{selected_month:02d}')
-
+    # --- LÓGICA DO EXTRATO ---
+    # Intervalo de datas (usa o índice de date, ao contrário de strftime na coluna)
+    last_day = monthrange(selected_year, selected_month)[1]
+    start_date = datetime(selected_year, selected_month, 1).date()
+    end_date = datetime(selected_year, selected_month, last_day).date()
     if period == '1':
-        query = query.filter(func.strftime('%d', CalendarEvent.date) <= '15')
+        end_date = datetime(selected_year, selected_month, 15).date()
     elif period == '2':
-        query = query.filter(func.strftime('%d', CalendarEvent.date) > '15')
+        start_date = datetime(selected_year, selected_month, 16).date()
 
-    classes_history = query.order_by(CalendarEvent.date).all()
-    
-    total_receber = sum(event.price for event in classes_history)
-    count_classes = len(classes_history)
-    total_minutes = sum(event.duration for event in classes_history)
+    period_filter = (
+        CalendarEvent.status != 'cancelled',
+        CalendarEvent.date >= start_date,
+        CalendarEvent.date <= end_date
+    )
+
+    # Totais calculados no banco em uma única consulta
+    total_receber, count_classes, total_minutes = db.session.query(
+        func.coalesce(func.sum(CalendarEvent.price), 0),
+        func.count(CalendarEvent.id),
+        func.coalesce(func.sum(CalendarEvent.duration), 0)
+    ).filter(*period_filter).one()
     total_hours = round(total_minutes / 60, 2)
 
+    # Linhas completas só para a tabela do extrato (paginação opcional)
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', type=int)
+    history_query = CalendarEvent.query.filter(*period_filter).order_by(CalendarEvent.date)
+    total_pages = 1
+    if per_page and per_page > 0:
+        total_pages = max(1, -(-count_classes // per_page))
+        page = min(max(page, 1), total_pages)
+        history_query = history_query.limit(per_page).offset((page - 1) * per_page)
+    classes_history = history_query.all()
+
     # --- NOVO: LÓGICA DAS ESTIMATIVAS DE TÉRMINO ---
-    active_turmas = Turma.query.filter_by(active=True).all()
+    # Quantidade fixa de consultas: turmas (+curso), aulas futuras agrupadas e feriados
+    active_turmas = Turma.query.options(joinedload(Turma.course)).filter_by(active=True).all()
     estimates = []
     
     today_date = datetime.today().date() # Pegamos a data de hoje
+    end_dates = calculate_end_dates(active_turmas)
+    future_counts = count_valid_from([t.id for t in active_turmas], today_date, inclusive=False)
 
     for t in active_turmas:
-        end_date = calculate_end_date(t)
-        
-        # CORREÇÃO AQUI:
-        # Adicionamos o filtro (CalendarEvent.date <= today_date)
-        # Isso garante que a barra de progresso mostre apenas o que já aconteceu ou é hoje.
-        valid_count = CalendarEvent.query.filter(
-            CalendarEvent.turma_id == t.id,
-            CalendarEvent.status.notin_(['cancelled', 'holiday']),
-            CalendarEvent.is_extra == False,
-            CalendarEvent.is_replacement == False,
-            CalendarEvent.date <= today_date  # <--- O PULO DO GATO
-        ).count()
+        # A barra de progresso mostra apenas o que já aconteceu ou é hoje (date <= today_date):
+        # contador total menos as aulas válidas depois de hoje
+        valid_count = (t.valid_count or 0) - future_counts.get(t.id, 0)
         
         # Garante que não mostre número negativo se o offset for muito agressivo
         current_lesson_num = max(0, valid_count + t.lesson_offset)
@@ -121,7 +144,7 @@ def index():
             'course': t.course.name,
             'current': current_lesson_num, 
             'total': t.total_classes,
-            'end_date': end_date
+            'end_date': end_dates[t.id]
         })
 
     return render_template('finance.html', 
@@ -133,17 +156,16 @@ def index():
                            selected_year=selected_year,
                            selected_period=period,
                            current_year=current_year,
+                           page=page,
+                           per_page=per_page,
+                           total_pages=total_pages,
                            estimates=estimates) # <--- Enviando nova lista
 
 # --- NOVO: ÁREA DE CONFERÊNCIA DE PAGAMENTOS ---
-@finance_bp.route('/conference')
-def conference():
-    today = datetime.today()
-    current_year = today.year
-    selected_month = request.args.get('month', today.month, type=int)
-    selected_year = request.args.get('year', today.year, type=int)
-    period = request.args.get('period', '1') 
-    
+CONFERENCE_PAGE_SIZE = 50
+
+def get_conference_period(selected_year, selected_month, period):
+    """Intervalo da quinzena: 1 a 15 ou 16 ao fim do mês."""
     start_date = datetime(selected_year, selected_month, 1).date()
     if period == '1':
         end_date = datetime(selected_year, selected_month, 15).date()
@@ -151,34 +173,128 @@ def conference():
         last_day = monthrange(selected_year, selected_month)[1]
         start_date = datetime(selected_year, selected_month, 16).date()
         end_date = datetime(selected_year, selected_month, last_day).date()
-        
-    # Pendentes: todas as aulas não pagas (não canceladas/feriado) até a data final do período
-    pending_events = CalendarEvent.query.filter(
-        CalendarEvent.status.notin_(['cancelled', 'holiday']),
-        CalendarEvent.is_paid == False,
-        CalendarEvent.date <= end_date
-    ).order_by(CalendarEvent.date).all()
-    
+    return start_date, end_date
+
+def conference_filters(kind, start_date, end_date):
+    if kind == 'pending':
+        # Pendentes: todas as aulas não pagas (não canceladas/feriado) até a data final do período
+        return (
+            CalendarEvent.status.notin_(['cancelled', 'holiday']),
+            CalendarEvent.is_paid == False,
+            CalendarEvent.date <= end_date
+        )
     # Confirmadas neste período: pagas e com data dentro do período atual
-    confirmed_events = CalendarEvent.query.filter(
+    return (
         CalendarEvent.status.notin_(['cancelled', 'holiday']),
         CalendarEvent.is_paid == True,
         CalendarEvent.date >= start_date,
         CalendarEvent.date <= end_date
-    ).order_by(CalendarEvent.date).all()
-    
-    total_pending = sum((e.price or 0.0) for e in pending_events)
-    total_confirmed = sum((e.price or 0.0) for e in confirmed_events)
+    )
+
+def get_conference_totals(start_date, end_date):
+    """Soma e quantidade de pendentes e confirmadas em uma única consulta."""
+    is_pending = CalendarEvent.is_paid == False
+    is_confirmed = and_(CalendarEvent.is_paid == True, CalendarEvent.date >= start_date)
+    price = func.coalesce(CalendarEvent.price, 0.0)
+    total_pending, count_pending, total_confirmed, count_confirmed = db.session.query(
+        func.coalesce(func.sum(case((is_pending, price), else_=0.0)), 0.0),
+        func.coalesce(func.sum(case((is_pending, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((is_confirmed, price), else_=0.0)), 0.0),
+        func.coalesce(func.sum(case((is_confirmed, 1), else_=0)), 0)
+    ).filter(
+        CalendarEvent.status.notin_(['cancelled', 'holiday']),
+        CalendarEvent.date <= end_date,
+        or_(is_pending, is_confirmed)
+    ).one()
+    return {
+        'total_pending': total_pending, 'count_pending': count_pending,
+        'total_confirmed': total_confirmed, 'count_confirmed': count_confirmed
+    }
+
+def get_conference_page(kind, start_date, end_date, after_date=None, after_id=None, limit=CONFERENCE_PAGE_SIZE):
+    """
+    Página por keyset em (date, id): busca só `limit` linhas depois do cursor,
+    sem OFFSET, então o custo não cresce com o tamanho do histórico pendente.
+    Retorna (eventos, cursor da próxima página ou None).
+    """
+    query = CalendarEvent.query.options(joinedload(CalendarEvent.turma)).filter(
+        *conference_filters(kind, start_date, end_date))
+    if after_date is not None and after_id is not None:
+        query = query.filter(or_(
+            CalendarEvent.date > after_date,
+            and_(CalendarEvent.date == after_date, CalendarEvent.id > after_id)
+        ))
+    events = query.order_by(CalendarEvent.date, CalendarEvent.id).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(events) > limit:
+        events = events[:limit]
+        next_cursor = {'after_date': events[-1].date.strftime('%Y-%m-%d'), 'after_id': events[-1].id}
+    return events, next_cursor
+
+def read_conference_args():
+    today = datetime.today()
+    selected_month = request.args.get('month', today.month, type=int)
+    selected_year = request.args.get('year', today.year, type=int)
+    period = request.args.get('period', '1')
+    return selected_year, selected_month, period
+
+@finance_bp.route('/conference')
+def conference():
+    current_year = datetime.today().year
+    selected_year, selected_month, period = read_conference_args()
+    start_date, end_date = get_conference_period(selected_year, selected_month, period)
+
+    pending_events, pending_cursor = get_conference_page('pending', start_date, end_date)
+    confirmed_events, confirmed_cursor = get_conference_page('confirmed', start_date, end_date)
+    totals = get_conference_totals(start_date, end_date)
     
     return render_template('conference.html',
                            pending_events=pending_events,
                            confirmed_events=confirmed_events,
-                           total_pending=total_pending,
-                           total_confirmed=total_confirmed,
+                           pending_cursor=pending_cursor,
+                           confirmed_cursor=confirmed_cursor,
                            selected_month=selected_month,
                            selected_year=selected_year,
                            selected_period=period,
-                           current_year=current_year)
+                           current_year=current_year,
+                           **totals)
+
+# NOVO: Próximas páginas das listas da conferência (rolagem infinita)
+@finance_bp.route('/api/conference_events/<string:kind>')
+def api_conference_events(kind):
+    if kind not in ('pending', 'confirmed'):
+        return jsonify({'success': False, 'message': 'Lista inválida'}), 400
+
+    selected_year, selected_month, period = read_conference_args()
+    start_date, end_date = get_conference_period(selected_year, selected_month, period)
+
+    # Cursor (after_date, after_id): os dois juntos, ou nenhum
+    after_date = request.args.get('after_date')
+    after_id = request.args.get('after_id', type=int)
+    if after_date or 'after_id' in request.args:
+        try:
+            after_date = datetime.strptime(after_date or '', '%Y-%m-%d').date()
+        except ValueError:
+            after_date = None
+        if after_date is None or after_id is None:
+            return jsonify({'success': False, 'message': 'Cursor inválido'}), 400
+    limit = min(max(request.args.get('limit', CONFERENCE_PAGE_SIZE, type=int), 1), 500)
+
+    events, next_cursor = get_conference_page(kind, start_date, end_date, after_date, after_id, limit)
+    return jsonify({
+        'success': True,
+        'events': [{
+            'id': e.id,
+            'date': e.date.strftime('%d/%m/%Y'),
+            'turma': e.turma.name if e.turma else None,
+            'student_name': e.student_name,
+            'is_extra': bool(e.is_extra),
+            'is_replacement': bool(e.is_replacement),
+            'price': e.price or 0.0
+        } for e in events],
+        'next_cursor': next_cursor
+    })
 
 @finance_bp.route('/api/toggle_payment/<int:event_id>', methods=['POST'])
 def api_toggle_payment(event_id):
@@ -189,11 +305,34 @@ def api_toggle_payment(event_id):
 
 @finance_bp.route('/api/confirm_all_payments', methods=['POST'])
 def api_confirm_all_payments():
-    data = request.json
-    event_ids = data.get('event_ids', [])
+    """
+    Confirma pagamentos por critério (mês/ano/quinzena da conferência e turma opcional)
+    com um único UPDATE. Se vier uma lista explícita `event_ids`, ela é processada em
+    blocos para respeitar o limite de parâmetros do SQLite.
+    Retorna a quantidade alterada e os novos totais da conferência.
+    """
+    data = request.json or {}
+    today = datetime.today()
+    selected_year = int(data.get('year') or today.year)
+    selected_month = int(data.get('month') or today.month)
+    period = str(data.get('period') or '1')
+    start_date, end_date = get_conference_period(selected_year, selected_month, period)
+
+    filters = list(conference_filters('pending', start_date, end_date))
+    if data.get('turma_id'):
+        filters.append(CalendarEvent.turma_id == int(data['turma_id']))
+
+    updated = 0
+    event_ids = data.get('event_ids')
     if event_ids:
-        events = CalendarEvent.query.filter(CalendarEvent.id.in_(event_ids)).all()
-        for event in events:
-            event.is_paid = True
-        db.session.commit()
-    return jsonify({'success': True})
\ No newline at end of file
+        for chunk in chunked(event_ids):
+            updated += CalendarEvent.query.filter(
+                CalendarEvent.id.in_(chunk),
+                CalendarEvent.is_paid == False
+            ).update({CalendarEvent.is_paid: True}, synchronize_session=False)
+    elif event_ids is None:
+        updated = CalendarEvent.query.filter(*filters).update(
+            {CalendarEvent.is_paid: True}, synchronize_session=False)
+    db.session.commit()
+
+    return jsonify({'success': True, 'updated': updated, **get_conference_totals(start_date, end_date)})
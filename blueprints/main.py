@@ -1,7 +1,15 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
-from models import db, Turma, CalendarEvent, Holiday, Lesson
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
+from models import db, Turma, CalendarEvent, Lesson, AppMeta
+from extensions import chunked
+from progress import valid_class_filter, refresh_turma_progress
+from holiday_calendar import get_holiday_calendar
+from versions import bump_versions
+from planner_cache import get_planner_cache, week_cache_key, bump_planner_version
+from sqlalchemy import or_, case, func, insert
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
 import calendar
+import heapq
 from collections import defaultdict
 
 main_bp = Blueprint('main', __name__)
@@ -18,62 +26,219 @@ def format_weekdays(days_str):
     return ", ".join(labels)
 
 
-def get_next_lesson_date(event):
-    next_event = CalendarEvent.query.filter(
-        CalendarEvent.turma_id == event.turma_id,
-        CalendarEvent.date > event.date,
-        CalendarEvent.status != 'cancelled',
-        CalendarEvent.status != 'holiday'
-    ).order_by(CalendarEvent.date).first()
-    return next_event.date.strftime('%d/%m') if next_event else "A definir"
+def get_next_lesson_dates(events):
+    """
+    Calcula a data da próxima aula de todos os eventos da semana em uma única consulta.
+    Agrupa os eventos das turmas por (turma_id, data) e usa uma janela
+    (MIN OVER turma_id ordenado por data, das linhas seguintes) que ignora os dias
+    em que a turma só tem aulas canceladas/feriado.
+    Retorna {event_id: 'dd/mm'} ou "A definir" quando não há próxima aula.
+    """
+    turma_events = [e for e in events if e.turma]
+    if not turma_events:
+        return {}
+
+    turma_ids = {e.turma_id for e in turma_events}
+    first_date = min(e.date for e in turma_events)
+
+    # Um dia "conta" como próxima aula se tiver ao menos um evento não cancelado/feriado
+    valid_date = case(
+        (CalendarEvent.status.notin_(['cancelled', 'holiday']), CalendarEvent.date),
+        else_=None
+    )
+    days = db.session.query(
+        CalendarEvent.turma_id.label('turma_id'),
+        CalendarEvent.date.label('date'),
+        func.min(valid_date).label('valid_date')
+    ).filter(
+        CalendarEvent.turma_id.in_(turma_ids),
+        CalendarEvent.date >= first_date
+    ).group_by(CalendarEvent.turma_id, CalendarEvent.date).subquery()
+
+    # Como as datas são únicas por turma no subselect, ROWS 1 FOLLOWING = datas posteriores
+    next_valid = func.min(days.c.valid_date).over(
+        partition_by=days.c.turma_id,
+        order_by=days.c.date,
+        rows=(1, None)
+    )
+    window = db.session.query(
+        days.c.turma_id, days.c.date, next_valid.label('next_date')
+    ).subquery()
+
+    week_days = {(e.turma_id, e.date) for e in turma_events}
+    last_date = max(d for _, d in week_days)
+    next_by_day = {}
+    for turma_id, day, next_date in db.session.query(window).filter(window.c.date <= last_date).all():
+        if (turma_id, day) in week_days:
+            next_by_day[(turma_id, day)] = next_date
+
+    return {
+        e.id: next_by_day[(e.turma_id, e.date)].strftime('%d/%m') if next_by_day.get((e.turma_id, e.date)) else "A definir"
+        for e in turma_events
+    }
+
+
+def resolve_lesson_info(events):
+    """
+    Resolve a lição atual/próxima de todos os eventos de turma da semana de uma vez.
+    Substitui o count() + 2 buscas de Lesson por evento por:
+      1. Uma consulta com janela (SUM OVER turma_id ordenado por data desc) que devolve,
+         para cada evento, quantas aulas válidas a turma tem da data dele em diante;
+         subtraído do contador Turma.valid_count dá as aulas em datas anteriores.
+      2. Uma busca única das lições indexada por (course_id, order).
+    O número de consultas é constante, independente de quantos eventos a semana tem.
+    """
+    turma_events = [e for e in events if e.turma]
+    if not turma_events:
+        return {}
+
+    turma_ids = {e.turma_id for e in turma_events}
+    first_date = min(e.date for e in turma_events)
+
+    # Mesmo critério de "aula válida" usado na contagem por evento
+    is_valid = case((valid_class_filter(), 1), else_=0)
+    # Ordem decrescente com o frame padrão (inclui o próprio dia): válidas com data >= a do evento.
+    # Só lê os eventos da semana em diante, não o histórico inteiro da turma.
+    from_date = func.sum(is_valid).over(partition_by=CalendarEvent.turma_id, order_by=CalendarEvent.date.desc())
+    counts = db.session.query(
+        CalendarEvent.id.label('event_id'),
+        from_date.label('valid_from_date')
+    ).filter(
+        CalendarEvent.turma_id.in_(turma_ids),
+        CalendarEvent.date >= first_date
+    ).subquery()
+
+    week_ids = [e.id for e in turma_events]
+    valid_from = dict(db.session.query(counts.c.event_id, counts.c.valid_from_date)
+                      .filter(counts.c.event_id.in_(week_ids)).all())
+
+    # Ajusta o número da aula somando o offset (ex: se offset é 9, a 1ª aula gerada é a 10)
+    lesson_indexes = {}
+    for event in turma_events:
+        previous_valid_count = (event.turma.valid_count or 0) - (valid_from.get(event.id) or 0)
+        lesson_indexes[event.id] = previous_valid_count + event.turma.lesson_offset
+
+    course_ids = {e.turma.course_id for e in turma_events}
+    orders = set()
+    for idx in lesson_indexes.values():
+        orders.update((idx, idx + 1))
+
+    # Ordenado por id para manter o mesmo resultado do .first() em ordens duplicadas
+    lessons = {}
+    for lesson in Lesson.query.filter(
+        Lesson.course_id.in_(course_ids),
+        Lesson.order.in_(orders)
+    ).order_by(Lesson.id).all():
+        lessons.setdefault((lesson.course_id, lesson.order), lesson)
+
+    lesson_info = {}
+    for event in turma_events:
+        real_lesson_index = lesson_indexes[event.id]
+        current_lesson = lessons.get((event.turma.course_id, real_lesson_index))
+        next_lesson = lessons.get((event.turma.course_id, real_lesson_index + 1))
 
+        lesson_info[event.id] = {
+            'current': current_lesson.title if current_lesson else f"Aula {real_lesson_index + 1}",
+            'link_p': current_lesson.link_presentation if current_lesson else None,
+            'link_g': current_lesson.link_guide if current_lesson else None,
+            'next': next_lesson.title if next_lesson else "-"
+        }
+    return lesson_info
 
-def check_auto_completion():
+
+def parse_start_time(day, start_time):
+    """
+    Início da aula como datetime. Cada parte de 'H:M' passa por int(), então
+    '09:30', '9:5' e ' 09:30' valem; formato ou horário inválido retorna None.
+    """
+    try:
+        h, m = map(int, start_time.split(':'))
+        return datetime(day.year, day.month, day.day, h, m)
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def check_auto_completion(now=None):
     """
     Verifica aulas agendadas que já passaram do horário (+90min)
     e marca como 'completed_auto'.
+    Datas passadas são concluídas com um UPDATE em lote; as de hoje (poucas) têm o
+    horário interpretado em Python (parse_start_time) e são concluídas num UPDATE por id.
+    A marca 'auto_completion_swept_at' evita repetir a varredura no mesmo minuto.
     """
-    now = datetime.now()
-    # Busca eventos agendados de hoje ou antes
-    events = CalendarEvent.query.filter(
+    now = now or datetime.now()
+    minute_mark = now.strftime('%Y-%m-%d %H:%M')
+    if AppMeta.get('auto_completion_swept_at') == minute_mark:
+        return
+
+    # Se for data passada, conclui
+    completed = CalendarEvent.query.filter(
         CalendarEvent.status == 'scheduled',
-        CalendarEvent.date <= now.date()
-    ).all()
+        CalendarEvent.date < now.date()
+    ).update({CalendarEvent.status: 'completed_auto'}, synchronize_session=False)
 
-    for event in events:
-        # Se for data passada, conclui
-        if event.date < now.date():
-            event.status = 'completed_auto'
-        # Se for hoje, verifica hora
-        elif event.date == now.date():
-            try:
-                h, m = map(int, event.start_time.split(':'))
-                event_dt = datetime(event.date.year, event.date.month, event.date.day, h, m)
-                # Se passou 90 min do início + duração (ou fixo 90min de tolerância após inicio)
-                # Vamos considerar: Inicio + Duração + 30min tolerância ou apenas Inicio + 90min
-                limit = event_dt + timedelta(minutes=90)
-                if now > limit:
-                    event.status = 'completed_auto'
-            except:
-                pass # Erro de formato de hora
+    # Se for hoje, conclui quando agora > início + 90min (horário inválido é ignorado)
+    limit = now - timedelta(minutes=90)
+    due_ids = []
+    for event_id, start_time in db.session.query(CalendarEvent.id, CalendarEvent.start_time).filter(
+        CalendarEvent.status == 'scheduled',
+        CalendarEvent.date == now.date()
+    ):
+        started = parse_start_time(now.date(), start_time)
+        if started is not None and started < limit:
+            due_ids.append(event_id)
+    for chunk in chunked(due_ids):
+        completed += CalendarEvent.query.filter(CalendarEvent.id.in_(chunk)).update(
+            {CalendarEvent.status: 'completed_auto'}, synchronize_session=False)
+
+    if completed:
+        bump_planner_version()
+    AppMeta.set('auto_completion_swept_at', minute_mark)
     db.session.commit()
 
+def iter_class_dates(start, end, schedule_days, holidays):
+    """
+    Gera, em ordem, as datas de aula entre start e end (inclusive) sem percorrer dia a dia:
+    para cada dia da semana da turma calcula a primeira ocorrência e avança de 7 em 7,
+    intercalando as sequências e pulando feriados.
+    """
+    weekdays = {int(d) for d in schedule_days.split(',') if d in ('0', '1', '2', '3', '4', '5', '6')} if schedule_days else set()
+    sequences = []
+    for weekday in weekdays:
+        first = start + timedelta(days=(weekday - start.weekday()) % 7)
+        total_weeks = (end - first).days // 7 + 1 if first <= end else 0
+        sequences.append([first + timedelta(weeks=w) for w in range(total_weeks)])
+
+    for day in heapq.merge(*sequences):
+        if day not in holidays:
+            yield day
+
+
 def generate_events_for_period(view_end_date):
     """
     Gera eventos para todas as turmas ativas.
     CORREÇÃO: Em vez de gerar apenas para a semana visível, verifica
     qual foi a última aula gerada de cada turma e preenche o 'gap' até a data de visualização.
     Isso corrige o problema da contagem de aulas quando a data de início é antiga.
+    As datas são calculadas a partir dos dias da semana (iter_class_dates) e do saldo de aulas
+    restantes; os dados de apoio são carregados uma vez e os novos eventos inseridos em lote.
+    Turmas cuja marca d'água (generated_until) já cobre a data pedida são ignoradas.
     """
-    turmas = Turma.query.filter(Turma.active == True).all()
-    holidays = {h.date: h.name for h in Holiday.query.all()}
+    end_date = view_end_date.date()
+    turmas = Turma.query.options(joinedload(Turma.course)).filter(
+        Turma.active == True,
+        or_(Turma.generated_until == None, Turma.generated_until < end_date)
+    ).all()
+    if not turmas:
+        return
+    holidays = get_holiday_calendar()
 
+    start_dates = {}
     for turma in turmas:
-        # Determina de onde começar a gerar para ESTA turma
-        last_event = CalendarEvent.query.filter_by(turma_id=turma.id).order_by(CalendarEvent.date.desc()).first()
-        
-        if last_event:
-            start_gen = last_event.date + timedelta(days=1)
+        # Determina de onde começar a gerar para ESTA turma (contador last_event_date)
+        last_date = turma.last_event_date
+        if last_date:
+            start_gen = last_date + timedelta(days=1)
         elif turma.start_date:
             # SE tiver offset (começar da aula X) e a data de início for passado,
             # começa a gerar de HOJE para não criar eventos retroativos inúteis.
@@ -83,62 +248,84 @@ def generate_events_for_period(view_end_date):
                 start_gen = turma.start_date
         else:
             start_gen = datetime.today().date()
-            
+
         # Se a data de início de geração for maior que a data limite de visualização, pula
-        if start_gen > view_end_date.date():
+        if start_gen <= end_date:
+            start_dates[turma.id] = start_gen
+        # Marca d'água: a turma fica coberta até end_date
+        turma.generated_until = end_date
+
+    if not start_dates:
+        db.session.commit()
+        return
+
+    # Pares (turma_id, data) já existentes no intervalo, carregados uma única vez
+    existing = set(db.session.query(CalendarEvent.turma_id, CalendarEvent.date).filter(
+        CalendarEvent.turma_id.in_(list(start_dates)),
+        CalendarEvent.date >= min(start_dates.values()),
+        CalendarEvent.date <= end_date
+    ).all())
+
+    new_rows = []
+    changed_turmas = set()
+    for turma in turmas:
+        if turma.id not in start_dates:
             continue
-            
-        # CONTAGEM INICIAL: Conta quantas aulas válidas já existem no banco (passado + futuro agendado)
-        # Isso evita fazer count() dentro do loop repetidamente e corrige o problema de gerar além do limite no mesmo lote.
-        valid_classes_count = CalendarEvent.query.filter(
-            CalendarEvent.turma_id == turma.id,
-            CalendarEvent.status.notin_(['cancelled', 'holiday']),
-            CalendarEvent.is_extra == False,
-            CalendarEvent.is_replacement == False
-        ).count()
-
-        current = start_gen
-        
-        # Loop dia a dia para esta turma até o fim do período de visualização
-        while current <= view_end_date.date():
-            if current in holidays:
-                current += timedelta(days=1)
-                continue
-                
-            weekday = str(current.weekday())
-            
-            if turma.schedule_days and weekday in turma.schedule_days.split(','):
-                # Verifica limite de aulas considerando o OFFSET (Ajuste de Progresso)
-                # Se o aluno pulou aulas (offset > 0) ou repetiu (offset < 0), o limite é sobre o CONTEÚDO.
-                current_lesson_index = valid_classes_count + turma.lesson_offset
-                
-                if current_lesson_index >= turma.total_classes:
-                    # Auto-Graduação
-                    turma.status = 'graduated'
-                    turma.active = False # Desativa para não gerar mais
-                    break # Sai do loop desta turma
-
-                exists = CalendarEvent.query.filter_by(
-                    turma_id=turma.id, date=current).first()
-
-                if not exists:
-                    new_event = CalendarEvent(
-                        turma_id=turma.id,
-                        date=current,
-                        start_time=turma.start_time,
-                        duration=turma.course.duration_minutes,
-                        price=turma.course.price_per_class,
-                        status='scheduled'
-                    )
-                    db.session.add(new_event)
-                    # Incrementa contador local para que a próxima iteração saiba que já existe mais uma aula
-                    valid_classes_count += 1
-            
-            current += timedelta(days=1)
-            
+
+        # CONTAGEM INICIAL: aulas válidas já existentes no banco (passado + futuro agendado)
+        valid_classes_count = turma.valid_count or 0
+
+        for current in iter_class_dates(start_dates[turma.id], end_date, turma.schedule_days, holidays):
+            # Verifica limite de aulas considerando o OFFSET (Ajuste de Progresso)
+            # Se o aluno pulou aulas (offset > 0) ou repetiu (offset < 0), o limite é sobre o CONTEÚDO.
+            if valid_classes_count + turma.lesson_offset >= turma.total_classes:
+                # Auto-Graduação
+                turma.status = 'graduated'
+                turma.active = False # Desativa para não gerar mais
+                changed_turmas.add(turma.id)
+                break
+
+            if (turma.id, current) not in existing:
+                new_rows.append({
+                    'turma_id': turma.id,
+                    'date': current,
+                    'start_time': turma.start_time,
+                    'duration': turma.course.duration_minutes,
+                    'price': turma.course.price_per_class,
+                    'status': 'scheduled'
+                })
+                existing.add((turma.id, current))
+                changed_turmas.add(turma.id)
+                valid_classes_count += 1
+                # Contadores materializados acompanham a inserção (mesma transação)
+                turma.valid_count = valid_classes_count
+                turma.last_event_date = current
+                turma.last_valid_date = max(turma.last_valid_date or current, current)
+
+    if new_rows:
+        # OR IGNORE: se outro processo gerou o mesmo (turma_id, data), o índice único descarta
+        db.session.execute(insert(CalendarEvent).prefix_with('OR IGNORE'), new_rows)
+    # Turmas com eventos novos ou formadas: invalida o ETag das APIs da turma e o planner
+    if changed_turmas:
+        bump_versions('turma', changed_turmas)
+        bump_planner_version()
     db.session.commit()
 
 
+def ensure_events_until(view_end_date):
+    """
+    Garante que os eventos estejam materializados até view_end_date.
+    A manutenção em segundo plano (maintenance.py) mantém o horizonte rolante; aqui só
+    geramos sob demanda quando alguma turma ativa ainda não cobre a data pedida.
+    """
+    pending = db.session.query(Turma.id).filter(
+        Turma.active == True,
+        or_(Turma.generated_until == None, Turma.generated_until < view_end_date.date())
+    ).first()
+    if pending:
+        generate_events_for_period(view_end_date)
+
+
 @main_bp.route('/toggle_status/<int:event_id>/<string:action>')
 def toggle_status(event_id, action):
     event = CalendarEvent.query.get_or_404(event_id)
@@ -168,6 +355,12 @@ def toggle_status(event_id, action):
     else:
         flash('Não é possível reativar aula antiga.', 'warning')
 
+    # A contagem de aulas válidas mudou: a turma precisa ser reavaliada na próxima geração
+    if event.turma:
+        event.turma.generated_until = None
+        refresh_turma_progress([event.turma_id])
+
+    bump_planner_version()
     db.session.commit()
     return redirect(url_for('main.planner'))
 
@@ -182,8 +375,8 @@ def planner():
     if selected_date_str:
         today = datetime.strptime(selected_date_str, '%Y-%m-%d')
     else:
-        # Se não tem data selecionada, gera eventos futuros para encontrar a próxima aula real
-        generate_events_for_period(datetime.today() + timedelta(days=60))
+        # Se não tem data selecionada, garante eventos futuros para encontrar a próxima aula real
+        ensure_events_until(datetime.today() + timedelta(days=current_app.config['GENERATION_HORIZON_DAYS']))
         
         now_date = datetime.now().date()
         # Busca a primeira aula válida de hoje em diante
@@ -199,9 +392,6 @@ def planner():
 
     start_of_week = today - timedelta(days=today.weekday())
     end_of_week = start_of_week + timedelta(days=6)
-    
-    # Executa verificação de conclusão automática
-    check_auto_completion()
 
     # 2. Opções do Seletor
     weeks_options = []
@@ -215,68 +405,56 @@ def planner():
         })
         base_week += timedelta(weeks=1)
 
-    # 3. Geração de Eventos Futuros
+    # 3. Geração de Eventos Futuros (só escreve se a semana estiver além do horizonte da manutenção)
     generation_end = end_of_week + timedelta(days=45) 
-    generate_events_for_period(generation_end)
+    ensure_events_until(generation_end)
+    
+    # 4. Semana renderizada: vem do cache enquanto a versão dos dados não mudar
+    cache = get_planner_cache(current_app)
+    key = week_cache_key(current_app, start_of_week.date())
+    cached = cache.get(key)
+    if cached is None:
+        cached = render_week(start_of_week, end_of_week)
+        cache.set(key, cached)
+    week_html, total_val = cached
+
+    holidays_list = get_holiday_calendar().entries
     
-    # 4. Busca Eventos
+    return render_template('planner.html', 
+                           week_html=week_html,
+                           total_expected=total_val,
+                           holidays_list=holidays_list,
+                           weeks_options=weeks_options,
+                           current_date=start_of_week)
+
+
+def render_week(start_of_week, end_of_week):
+    """HTML dos 7 dias da semana + valor previsto (o que fica no cache do planner)."""
+    # Busca Eventos
     events = CalendarEvent.query.filter(
         CalendarEvent.date >= start_of_week.date(),
         CalendarEvent.date <= end_of_week.date()
     ).order_by(CalendarEvent.date, CalendarEvent.start_time).all()
 
-    holidays_list = Holiday.query.order_by(Holiday.date).all()
-    
-    # 5. Preparação de Dados
-    next_dates = {}
+    # Preparação de Dados
     weekdays_map = {}
-    lesson_info = {} 
+    # Lições e próximas datas resolvidas em lote (quantidade fixa de consultas por semana)
+    lesson_info = resolve_lesson_info(events)
+    next_dates = get_next_lesson_dates(events)
     
-    from collections import defaultdict
     grouped_events = defaultdict(list)
     
     for event in events:
         grouped_events[event.date].append(event)
         
         if event.turma:
-            next_dates[event.id] = get_next_lesson_date(event)
             weekdays_map[event.id] = format_weekdays(event.turma.schedule_days)
-            
-            # Conta aulas passadas para saber qual lição é a atual
-            previous_valid_count = CalendarEvent.query.filter(
-                CalendarEvent.turma_id == event.turma_id,
-                CalendarEvent.date < event.date,
-                CalendarEvent.status.notin_(['cancelled', 'holiday']),
-                CalendarEvent.is_extra == False,
-                CalendarEvent.is_replacement == False
-            ).count()
-            
-            # Ajusta o número da aula somando o offset (ex: se offset é 9, a 1ª aula gerada é a 10)
-            real_lesson_index = previous_valid_count + event.turma.lesson_offset
-            
-            current_lesson = Lesson.query.filter_by(
-                course_id=event.turma.course_id, 
-                order=real_lesson_index
-            ).first()
-            
-            next_lesson = Lesson.query.filter_by(
-                course_id=event.turma.course_id, 
-                order=real_lesson_index + 1
-            ).first()
-            
-            # --- AQUI ESTÁ O SEGREDO: ENVIAR OS LINKS ---
-            lesson_info[event.id] = {
-                'current': current_lesson.title if current_lesson else f"Aula {real_lesson_index + 1}",
-                'link_p': current_lesson.link_presentation if current_lesson else None, # <--- VERIFIQUE ISSO
-                'link_g': current_lesson.link_guide if current_lesson else None,        # <--- VERIFIQUE ISSO
-                'next': next_lesson.title if next_lesson else "-"
-            }
         else:
             next_dates[event.id] = "-"
             weekdays_map[event.id] = "Avulso"
             lesson_info[event.id] = {'current': '-', 'link_p': None, 'link_g': None, 'next': '-'}
 
-    # 6. Agrupamento para HTML
+    # Agrupamento para HTML
     week_names = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
     daily_planner = []
     
@@ -291,17 +469,19 @@ def planner():
         current_day_iter += timedelta(days=1)
 
     total_val = sum(e.price for e in events if e.status not in ['cancelled', 'holiday'] and not e.is_extra and not e.is_replacement)
-    
-    return render_template('planner.html', 
-                           daily_planner=daily_planner,
-                           total_expected=total_val,
-                           get_form_url=get_google_form_url,
-                           holidays_list=holidays_list,
-                           next_dates=next_dates,
-                           weekdays_map=weekdays_map,
-                           lesson_info=lesson_info,
-                           weeks_options=weeks_options,
-                           current_date=start_of_week)
+
+    week_html = render_template('planner_week.html',
+                                daily_planner=daily_planner,
+                                get_form_url=get_google_form_url,
+                                next_dates=next_dates,
+                                weekdays_map=weekdays_map,
+                                lesson_info=lesson_info)
+    return week_html, total_val
+
+
+@main_bp.route('/api/planner_cache_stats')
+def api_planner_cache_stats():
+    return jsonify(get_planner_cache(current_app).stats())
 
 
 def get_google_form_url(form_type, data):
@@ -0,0 +1,120 @@
+"""
+Teste de concorrência do modo de produção (SQLite em WAL).
+
+Abre uma transação de escrita que segura o lock do banco por alguns segundos e,
+enquanto isso, dispara leitores em paralelo contra páginas somente-leitura
+(/finance/ e /finance/conference) pelo test client. Com WAL os leitores devem
+responder sem esperar o escritor terminar.
+
+Uso:
+    python check_concurrency.py [--readers 8] [--hold 2.0]
+
+Sai com código 1 se algum leitor demorou tanto quanto o escritor (bloqueado).
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta, datetime
+
+
+def seed(app):
+    from extensions import db
+    from models import Course, Turma
+    from blueprints.main import generate_events_for_period
+
+    with app.app_context():
+        course = Course(name='Curso Teste', duration_minutes=60, price_per_class=30.0)
+        db.session.add(course)
+        db.session.flush()
+        db.session.add(Turma(name='Turma Teste', course_id=course.id, schedule_days='0,2,4',
+                             start_time='19:00', start_date=date.today() - timedelta(days=90),
+                             total_classes=200))
+        db.session.commit()
+        generate_events_for_period(datetime.today() + timedelta(days=30))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--hold', type=float, default=2.0, help='segundos que o escritor segura o lock')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='planner_concurrency_')
+    try:
+        from app import create_app
+        from extensions import db
+
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmpdir, 'agenda.db'),
+            'MAINTENANCE_INTERVAL': 0,
+        })
+        seed(app)
+
+        with app.app_context():
+            engine = db.engine
+        writer_ready = threading.Event()
+
+        def writer():
+            conn = engine.raw_connection()
+            try:
+                cursor = conn.cursor()
+                # EXCLUSIVE: no modo rollback-journal bloqueia leitores; no WAL, não
+                cursor.execute('BEGIN EXCLUSIVE')
+                cursor.execute('UPDATE calendar_event SET is_paid = 1')
+                writer_ready.set()
+                time.sleep(args.hold)
+                conn.commit()
+            finally:
+                conn.close()
+
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def reader(path):
+            client = app.test_client()
+            start = time.perf_counter()
+            response = client.get(path)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code != 200:
+                    errors.append(f'{path}: HTTP {response.status_code}')
+
+        writer_thread = threading.Thread(target=writer)
+        writer_thread.start()
+        writer_ready.wait()
+
+        paths = ['/finance/', '/finance/conference']
+        readers = [threading.Thread(target=reader, args=(paths[i % len(paths)],)) for i in range(args.readers)]
+        for t in readers:
+            t.start()
+        for t in readers:
+            t.join()
+        writer_thread.join()
+
+        with app.app_context():
+            journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+
+        slowest = max(latencies)
+        print(f"journal_mode: {journal_mode}")
+        print(f"Escritor segurou o lock por {args.hold:.2f}s")
+        print(f"{len(latencies)} leitores: mais lento {slowest:.3f}s, média {sum(latencies) / len(latencies):.3f}s")
+        for error in errors:
+            print(f"[Erro] {error}")
+
+        if errors or slowest >= args.hold:
+            print("FALHOU: leitores ficaram bloqueados pelo escritor.")
+            return 1
+        print("OK: leitores não foram bloqueados pelo escritor.")
+        return 0
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
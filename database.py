@@ -0,0 +1,136 @@
+import os
+from contextlib import contextmanager
+from sqlalchemy import event
+from extensions import db
+
+# Ajustes do SQLite para uso com vários usuários/workers ao mesmo tempo:
+# WAL deixa leitores rodarem enquanto um escritor grava, busy_timeout faz o
+# escritor esperar o lock em vez de falhar na hora com "database is locked".
+
+def engine_options(config):
+    """Opções do engine (pool e timeout do driver) a partir da configuração."""
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    if not uri.startswith('sqlite'):
+        return {'pool_size': config['DB_POOL_SIZE'], 'max_overflow': config['DB_MAX_OVERFLOW'],
+                'pool_timeout': config['DB_POOL_TIMEOUT'], 'pool_pre_ping': True}
+
+    options = {
+        'connect_args': {
+            'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000,
+            'check_same_thread': False,
+        },
+    }
+    # Banco em memória usa pool de conexão única; só arquivos aceitam o QueuePool
+    if uri not in ('sqlite://', 'sqlite:///:memory:'):
+        options.update({
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+        })
+    return options
+
+
+def configure_sqlite(app):
+    """Registra os PRAGMAs aplicados a cada nova conexão do pool."""
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        return
+
+    busy_timeout = int(app.config['SQLITE_BUSY_TIMEOUT'])
+    journal_mode = app.config['SQLITE_JOURNAL_MODE']
+    synchronous = app.config['SQLITE_SYNCHRONOUS']
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout={busy_timeout}")
+        cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.close()
+
+    with app.app_context():
+        event.listen(db.engine, 'connect', set_pragmas)
+
+
+def sqlite_path(app):
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if not uri.startswith('sqlite:///'):
+        return None
+    return uri.replace('sqlite:///', '', 1)
+
+
+try:
+    import fcntl
+
+    def _lock(lock_file):
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+
+    def _try_lock(lock_file):
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _unlock(lock_file):
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+except ImportError:  # Windows
+    import msvcrt
+
+    def _lock(lock_file):
+        lock_file.seek(0)
+        # LK_LOCK desiste após ~10s; tenta de novo até conseguir
+        while True:
+            try:
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+
+    def _try_lock(lock_file):
+        lock_file.seek(0)
+        try:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def _unlock(lock_file):
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(lock_path):
+    """
+    Lock exclusivo entre processos (fcntl no Linux/macOS, msvcrt no Windows).
+    Usado para que só um worker por vez rode a manutenção de esquema.
+    """
+    with open(lock_path, 'a+') as lock_file:
+        _lock(lock_file)
+        try:
+            yield
+        finally:
+            _unlock(lock_file)
+
+
+@contextmanager
+def try_file_lock(lock_path):
+    """Como file_lock, mas sem esperar: rende False (e não bloqueia) se outro processo tem o lock."""
+    with open(lock_path, 'a+') as lock_file:
+        if not _try_lock(lock_file):
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            _unlock(lock_file)
+
+
+@contextmanager
+def schema_lock(app):
+    """Lock de manutenção de esquema ao lado do arquivo do banco (no-op fora do SQLite)."""
+    path = sqlite_path(app)
+    if not path:
+        yield
+        return
+    with file_lock(os.path.abspath(path) + '.schema.lock'):
+        yield
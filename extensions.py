@@ -1,2 +1,18 @@
+from itertools import islice
 from flask_sqlalchemy import SQLAlchemy
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy()
+
+# Limite seguro de parâmetros por IN (...) no SQLite (padrão antigo: 999 variáveis)
+SQLITE_CHUNK_SIZE = 500
+
+def chunked(items, size=SQLITE_CHUNK_SIZE):
+    """
+    Divide uma sequência em blocos para consultas IN (...) e inserts em lote.
+    Consome o iterável sob demanda, então também serve para geradores/streams.
+    """
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
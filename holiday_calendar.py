@@ -0,0 +1,171 @@
+import threading
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import date, timedelta
+from flask import current_app
+from sqlalchemy import insert
+from extensions import db, chunked
+from models import Holiday, AppMeta, CalendarEvent, Turma
+from progress import refresh_turma_progress
+
+# Calendário de feriados em memória (um por app), compartilhado por geração de
+# eventos, financeiro e planner. A versão fica no banco (AppMeta 'holidays_version'):
+# toda escrita em Holiday chama bump_holiday_version() na mesma transação, e cada
+# processo recarrega quando percebe que a versão mudou.
+
+HolidayEntry = namedtuple('HolidayEntry', ['id', 'date', 'name'])
+
+
+class HolidayCalendar:
+    """Lista ordenada de datas + dicionário data -> feriado (buscas O(log n))."""
+
+    def __init__(self, entries):
+        self.entries = sorted(entries, key=lambda h: h.date)
+        self.dates = [h.date for h in self.entries]
+        self.by_date = {h.date: h for h in self.entries}
+
+    def __contains__(self, day):
+        return day in self.by_date
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, day):
+        return self.by_date.get(day)
+
+    def between(self, start, end):
+        """Datas de feriado entre start e end (inclusive), em ordem."""
+        return self.dates[bisect_left(self.dates, start):bisect_right(self.dates, end)]
+
+
+def get_holiday_calendar():
+    """
+    Retorna o calendário atual, recarregando só se a versão no banco mudou.
+    O cache é do app (app.extensions): apps com bancos diferentes no mesmo
+    processo não compartilham feriados.
+    """
+    cache = current_app.extensions['holiday_calendar']
+    version = AppMeta.get('holidays_version', '0')
+    calendar = cache['calendar']
+    if calendar is not None and cache['version'] == version:
+        return calendar
+
+    rows = db.session.query(Holiday.id, Holiday.date, Holiday.name).all()
+    calendar = HolidayCalendar(HolidayEntry(*row) for row in rows)
+    with cache['lock']:
+        cache['version'] = version
+        cache['calendar'] = calendar
+    return calendar
+
+
+def init_app(app):
+    app.extensions['holiday_calendar'] = {'lock': threading.Lock(), 'version': None, 'calendar': None}
+
+
+def bump_holiday_version():
+    """Invalida o cache de todos os processos (commit fica a cargo de quem chamou)."""
+    AppMeta.set('holidays_version', str(int(AppMeta.get('holidays_version', '0')) + 1))
+
+
+# --- FERIADOS NACIONAIS (BRASIL) ---
+
+def easter_date(year):
+    """Domingo de Páscoa (algoritmo de Meeus/Jones/Butcher, calendário gregoriano)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def national_holidays(year):
+    """Feriados nacionais fixos + móveis (baseados na Páscoa) de um ano, em ordem."""
+    easter = easter_date(year)
+    holidays = [
+        (date(year, 1, 1), 'Confraternização Universal'),
+        (easter - timedelta(days=48), 'Carnaval'),
+        (easter - timedelta(days=47), 'Carnaval'),
+        (easter - timedelta(days=2), 'Sexta-feira Santa'),
+        (date(year, 4, 21), 'Tiradentes'),
+        (date(year, 5, 1), 'Dia do Trabalho'),
+        (easter + timedelta(days=60), 'Corpus Christi'),
+        (date(year, 9, 7), 'Independência do Brasil'),
+        (date(year, 10, 12), 'Nossa Senhora Aparecida'),
+        (date(year, 11, 2), 'Finados'),
+        (date(year, 11, 15), 'Proclamação da República'),
+        (date(year, 11, 20), 'Dia da Consciência Negra'),
+        (date(year, 12, 25), 'Natal'),
+    ]
+    return sorted(holidays)
+
+
+# --- ESCRITA EM LOTE ---
+
+def _turmas_on_dates(dates):
+    turma_ids = set()
+    for chunk in chunked(dates):
+        turma_ids.update(tid for (tid,) in db.session.query(CalendarEvent.turma_id).filter(
+            CalendarEvent.date.in_(chunk), CalendarEvent.turma_id != None).distinct())
+    return turma_ids
+
+
+def add_holidays(entries):
+    """
+    Insere vários feriados [(data, nome), ...] e marca os eventos dessas datas como
+    'holiday' com UPDATEs em lote, tudo na transação atual (commit fica com quem chamou).
+    Datas já cadastradas são ignoradas. Retorna a lista de datas inseridas.
+    """
+    wanted = {}
+    for day, name in entries:
+        wanted.setdefault(day, name)
+    if not wanted:
+        return []
+
+    existing = set()
+    for chunk in chunked(wanted):
+        existing.update(d for (d,) in db.session.query(Holiday.date).filter(Holiday.date.in_(chunk)))
+    new_dates = sorted(d for d in wanted if d not in existing)
+    if not new_dates:
+        return []
+
+    db.session.execute(insert(Holiday), [{'date': d, 'name': wanted[d]} for d in new_dates])
+    for chunk in chunked(new_dates):
+        CalendarEvent.query.filter(CalendarEvent.date.in_(chunk)).update(
+            {CalendarEvent.status: 'holiday'}, synchronize_session=False)
+
+    _after_holiday_change(new_dates)
+    return new_dates
+
+
+def remove_holidays(holidays):
+    """
+    Remove os feriados informados e devolve para 'scheduled' os eventos que estavam
+    marcados como feriado nessas datas, com UPDATE/DELETE em lote (sem commit).
+    """
+    dates = sorted({h.date for h in holidays})
+    if not dates:
+        return []
+
+    for chunk in chunked(dates):
+        CalendarEvent.query.filter(
+            CalendarEvent.date.in_(chunk),
+            CalendarEvent.status == 'holiday'
+        ).update({CalendarEvent.status: 'scheduled'}, synchronize_session=False)
+        Holiday.query.filter(Holiday.date.in_(chunk)).delete(synchronize_session=False)
+
+    _after_holiday_change(dates)
+    return dates
+
+
+def _after_holiday_change(dates):
+    # Feriados mudam o calendário de todas as turmas: reavalia a geração,
+    # atualiza os contadores das turmas afetadas e invalida o cache dos processos
+    Turma.query.update({Turma.generated_until: None}, synchronize_session=False)
+    refresh_turma_progress(_turmas_on_dates(dates))
+    bump_holiday_version()
@@ -0,0 +1,153 @@
+import codecs
+import csv
+import io
+import json
+from sqlalchemy import insert, func
+from extensions import db, chunked, SQLITE_CHUNK_SIZE
+from models import Turma, Lesson
+from versions import bump_version, bump_versions, get_versions, make_etag, version_key
+from planner_cache import bump_planner_version
+
+# Importação de aulas em lote: lê o upload linha a linha (sem carregar o arquivo
+# inteiro), insere em blocos com INSERT em lote e ignora títulos que o curso já tinha.
+# Exportação em stream (texto, NDJSON ou CSV) com ETag baseado na versão do
+# curso (versions.py), incrementada por toda escrita nas aulas do curso.
+
+
+def bump_lessons_version(course_id):
+    """
+    Invalida os ETags das aulas do curso e das turmas do curso, cujo ajuste
+    de progresso lista as aulas, e o cache do planner (na transação atual).
+    """
+    bump_version('course', course_id)
+    bump_versions('turma', [tid for (tid,) in db.session.query(Turma.id).filter(Turma.course_id == course_id)])
+    bump_planner_version()
+
+
+def iter_stream_lines(stream, encoding='utf-8-sig', block_size=64 * 1024):
+    """Linhas não vazias (sem espaços nas pontas) de um stream binário, decodificadas aos poucos."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ''
+    while True:
+        block = stream.read(block_size)
+        # A última parte pode ser uma linha cortada no meio; fica para o próximo bloco
+        *lines, pending = (pending + decoder.decode(block, final=not block)).split('\n')
+        for line in lines:
+            line = line.strip()
+            if line:
+                yield line
+        if not block:
+            break
+    if pending.strip():
+        yield pending.strip()
+
+
+def iter_numbered_titles(lines):
+    """
+    Extrator de texto colado da plataforma: a linha logo abaixo de uma linha
+    composta só por números (índice da aula) é o título da aula.
+    """
+    after_number = False
+    for line in lines:
+        if after_number:
+            yield line
+        after_number = line.isdigit()
+
+
+def import_lesson_titles(course_id, titles, chunk_size=SQLITE_CHUNK_SIZE):
+    """
+    Insere os títulos no fim do curso, em blocos, dentro da transação atual
+    (commit fica com quem chamou). Títulos que o curso já tinha antes da
+    importação são ignorados; repetições dentro do próprio arquivo (ex. "Revisão")
+    são mantidas, porque a ordem define a aula de cada número de classe.
+    Retorna o progresso por bloco.
+    """
+    existing = {title for (title,) in db.session.query(Lesson.title).filter(Lesson.course_id == course_id)}
+    max_order = db.session.query(func.max(Lesson.order)).filter(Lesson.course_id == course_id).scalar()
+    current_order = max_order + 1 if max_order is not None else 0
+
+    progress = []
+    for number, chunk in enumerate(chunked(titles, chunk_size), start=1):
+        rows = []
+        for title in chunk:
+            if title in existing:
+                continue
+            rows.append({'course_id': course_id, 'title': title, 'order': current_order})
+            current_order += 1
+        if rows:
+            db.session.execute(insert(Lesson), rows)
+        progress.append({'chunk': number, 'read': len(chunk), 'imported': len(rows), 'skipped': len(chunk) - len(rows)})
+    if any(p['imported'] for p in progress):
+        bump_lessons_version(course_id)
+    return progress
+
+
+def summarize_import(progress):
+    imported = sum(p['imported'] for p in progress)
+    skipped = sum(p['skipped'] for p in progress)
+    return imported, skipped
+
+
+# --- EXPORTAÇÃO ---
+
+EXPORT_MIMETYPES = {
+    'text': 'text/plain; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def lessons_etag(course_id, export_format):
+    version, = get_versions(version_key('course', course_id))
+    return make_etag('lessons', course_id, version, export_format)
+
+
+def iter_course_lessons(course_id, batch_size=SQLITE_CHUNK_SIZE):
+    """(título, link apresentação, link guia) das aulas em ordem, lidas em lotes."""
+    return db.session.query(Lesson.title, Lesson.link_presentation, Lesson.link_guide).filter(
+        Lesson.course_id == course_id
+    ).order_by(Lesson.order, Lesson.id).execution_options(yield_per=batch_size)
+
+
+def iter_export_text(rows):
+    """
+    Blocos de 7 linhas por aula (número, título e placeholders no formato da
+    plataforma), o mesmo texto que o extrator de importação entende.
+    """
+    for number, (title, link_presentation, link_guide) in enumerate(rows, 1):
+        separator = "" if number == 1 else "\n"
+        yield f"{separator}{number}\n{title}\nProfessor(a)\nYYYY-MM-DD HH:MM\nDia\nGravações da aula\n"
+
+
+def iter_export_ndjson(rows):
+    for number, (title, link_presentation, link_guide) in enumerate(rows, 1):
+        yield json.dumps({'number': number, 'title': title, 'link_presentation': link_presentation,
+                          'link_guide': link_guide}, ensure_ascii=False) + "\n"
+
+
+def iter_export_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    writer.writerow(['number', 'title', 'link_presentation', 'link_guide'])
+    yield flush()
+    for number, (title, link_presentation, link_guide) in enumerate(rows, 1):
+        writer.writerow([number, title, link_presentation or '', link_guide or ''])
+        yield flush()
+
+
+EXPORTERS = {
+    'text': iter_export_text,
+    'ndjson': iter_export_ndjson,
+    'csv': iter_export_csv,
+}
+
+
+def export_lessons(course_id, export_format):
+    return EXPORTERS[export_format](iter_course_lessons(course_id))
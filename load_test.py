@@ -0,0 +1,261 @@
+"""
+Teste de carga local (fim a fim) com relatório de contenção do SQLite.
+
+Popula um banco temporário (seed_data.py) e dispara requisições contra o app
+WSGI pelo test client, a partir de um pool de threads (um processo, como o
+servidor de desenvolvimento) ou de processos (um app por processo, como vários
+workers do gunicorn/waitress no mesmo arquivo). O mix de rotas é configurável:
+recarregar o planner em semanas variadas, alternar status de aula, alternar
+pagamento e as páginas do financeiro. Tudo roda offline.
+
+Relata latência p50/p95/p99 por operação e no total, vazão, e quantas vezes o
+SQLite respondeu "database is locked" (com as novas tentativas feitas).
+
+Uso:
+    python load_test.py [--workers 8] [--mode thread|process] [--requests 400]
+                        [--mix planner=5,status=2,payment=2,finance=1,conference=1]
+                        [--retries 3] [--busy-timeout 5000] [--output load.json]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import date, timedelta
+
+from seed_data import seed_database
+
+DEFAULT_MIX = 'planner=5,status=2,payment=2,finance=1,conference=1'
+STATUS_ACTIONS = ['cancel', 'reactivate', 'conclude', 'scheduled']
+PLANNER_WEEK_OFFSETS = range(-2, 13)
+
+
+def parse_mix(text):
+    """'planner=5,status=2' -> {'planner': 5, 'status': 2}"""
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Operação desconhecida no mix: {name!r} (opções: {', '.join(OPERATIONS)})")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+# Cada operação sorteia uma requisição (método, caminho); uma nova tentativa repete a mesma
+
+def op_planner(rng, targets):
+    # Semanas reais (?date=início da semana), incluindo as além do horizonte já gerado
+    return 'GET', f"/?date={rng.choice(targets['weeks'])}"
+
+
+def op_status(rng, targets):
+    return 'GET', f"/toggle_status/{rng.choice(targets['event_ids'])}/{rng.choice(STATUS_ACTIONS)}"
+
+
+def op_payment(rng, targets):
+    return 'POST', f"/finance/api/toggle_payment/{rng.choice(targets['event_ids'])}"
+
+
+def op_finance(rng, targets):
+    return 'GET', '/finance/'
+
+
+def op_conference(rng, targets):
+    return 'GET', '/finance/conference'
+
+
+OPERATIONS = {
+    'planner': op_planner,
+    'status': op_status,
+    'payment': op_payment,
+    'finance': op_finance,
+    'conference': op_conference,
+}
+
+
+def is_locked_error(error):
+    return 'database is locked' in str(error) or 'database table is locked' in str(error)
+
+
+def run_requests(app, count, mix, targets, retries, seed):
+    """
+    Executa `count` requisições sorteadas do mix com um test client próprio.
+    Retorna uma lista de (operação, segundos, ok, erros de lock, novas tentativas, erro).
+    """
+    rng = random.Random(seed)
+    client = app.test_client()
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples = []
+    for _ in range(count):
+        name = rng.choices(names, weights)[0]
+        method, path = OPERATIONS[name](rng, targets)
+        locked = 0
+        attempts = 0
+        error = None
+        ok = False
+        start = time.perf_counter()
+        while True:
+            try:
+                response = client.open(path, method=method)
+                ok = response.status_code < 400
+                if not ok:
+                    error = f'HTTP {response.status_code}'
+                break
+            except Exception as e:
+                if is_locked_error(e):
+                    locked += 1
+                    if attempts < retries:
+                        attempts += 1
+                        time.sleep(0.05 * attempts)
+                        continue
+                error = f'{type(e).__name__}: {e}'.splitlines()[0][:200]
+                break
+        samples.append((name, time.perf_counter() - start, ok, locked, attempts, error))
+    return samples
+
+
+def make_app(database_path, busy_timeout):
+    from app import create_app
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + database_path,
+        'MAINTENANCE_INTERVAL': 0,
+        'BACKUP_INTERVAL': 0,
+        'SQLITE_BUSY_TIMEOUT': busy_timeout,
+        # Exceções chegam ao harness (para contar os "database is locked") em vez de virar 500
+        'PROPAGATE_EXCEPTIONS': True,
+    })
+
+
+def process_worker(database_path, busy_timeout, count, mix, targets, retries, seed):
+    # Cada processo abre o próprio app e engine, como um worker do servidor de produção
+    return run_requests(make_app(database_path, busy_timeout), count, mix, targets, retries, seed)
+
+
+def percentile(sorted_values, pct):
+    """Percentil por posição mais próxima (nearest-rank) de uma lista ordenada."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(samples, wall_seconds):
+    def stats(group):
+        latencies = sorted(s[1] * 1000 for s in group)
+        return {
+            'requests': len(group),
+            'errors': sum(1 for s in group if not s[2]),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'max_ms': round(latencies[-1], 2) if latencies else 0.0,
+            'locked_errors': sum(s[3] for s in group),
+            'retries': sum(s[4] for s in group),
+        }
+
+    by_operation = {}
+    for sample in samples:
+        by_operation.setdefault(sample[0], []).append(sample)
+    errors = {}
+    for sample in samples:
+        if sample[5]:
+            errors[sample[5]] = errors.get(sample[5], 0) + 1
+    return {
+        'wall_seconds': round(wall_seconds, 3),
+        'throughput_rps': round(len(samples) / wall_seconds, 1) if wall_seconds else 0.0,
+        'total': stats(samples),
+        'operations': {name: stats(group) for name, group in sorted(by_operation.items())},
+        'error_messages': dict(sorted(errors.items(), key=lambda item: -item[1])[:10]),
+    }
+
+
+def print_summary(summary):
+    print(f"{'operação':<12} {'reqs':>6} {'erros':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'locked':>7} {'retries':>8}")
+    rows = list(summary['operations'].items()) + [('TOTAL', summary['total'])]
+    for name, s in rows:
+        print(f"{name:<12} {s['requests']:>6} {s['errors']:>6} {s['p50_ms']:>7.1f}ms {s['p95_ms']:>7.1f}ms "
+              f"{s['p99_ms']:>7.1f}ms {s['locked_errors']:>7} {s['retries']:>8}")
+    print(f"Vazão: {summary['throughput_rps']} req/s em {summary['wall_seconds']}s")
+    for message, count in summary['error_messages'].items():
+        print(f"[Erro] {count}x {message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--mode', choices=['thread', 'process'], default='thread')
+    parser.add_argument('--requests', type=int, default=400, help='total de requisições')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='pesos das operações')
+    parser.add_argument('--retries', type=int, default=3, help='novas tentativas após "database is locked"')
+    parser.add_argument('--busy-timeout', type=int, default=5000, help='PRAGMA busy_timeout (ms) dos workers')
+    parser.add_argument('--turmas', type=int, default=20)
+    parser.add_argument('--years', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='arquivo JSON para gravar o resultado')
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    tmpdir = tempfile.mkdtemp(prefix='planner_load_')
+    try:
+        database_path = os.path.join(tmpdir, 'agenda.db')
+        app = make_app(database_path, args.busy_timeout)
+        seed_database(app, turmas=args.turmas, years=args.years, seed=args.seed)
+
+        # Alvos das escritas: aulas geradas das próximas semanas (as que o planner mostra)
+        from extensions import db
+        from models import CalendarEvent
+        with app.app_context():
+            event_ids = [eid for (eid,) in db.session.query(CalendarEvent.id).filter(
+                CalendarEvent.turma_id != None,
+                CalendarEvent.date.between(date.today() - timedelta(days=7), date.today() + timedelta(days=14))
+            )]
+        if not event_ids:
+            print("[Erro] Nenhum evento nas próximas semanas para as escritas; aumente --turmas.")
+            return 1
+
+        # Semanas do planner: duas para trás e até 12 para frente (as últimas passam do
+        # horizonte gerado pela semeadura, então o GET também gera eventos sob demanda)
+        monday = date.today() - timedelta(days=date.today().weekday())
+        targets = {
+            'event_ids': event_ids,
+            'weeks': [(monday + timedelta(weeks=offset)).isoformat() for offset in PLANNER_WEEK_OFFSETS],
+        }
+
+        per_worker = [args.requests // args.workers + (1 if i < args.requests % args.workers else 0)
+                      for i in range(args.workers)]
+        print(f"{args.requests} requisições, {args.workers} workers ({args.mode}), mix {mix}")
+
+        start = time.perf_counter()
+        if args.mode == 'thread':
+            with ThreadPoolExecutor(args.workers) as pool:
+                futures = [pool.submit(run_requests, app, count, mix, targets, args.retries, args.seed + i)
+                           for i, count in enumerate(per_worker)]
+                samples = [sample for future in futures for sample in future.result()]
+        else:
+            with ProcessPoolExecutor(args.workers) as pool:
+                futures = [pool.submit(process_worker, database_path, args.busy_timeout, count, mix, targets,
+                                       args.retries, args.seed + i)
+                           for i, count in enumerate(per_worker)]
+                samples = [sample for future in futures for sample in future.result()]
+        summary = summarize(samples, time.perf_counter() - start)
+        summary['config'] = {'workers': args.workers, 'mode': args.mode, 'requests': args.requests, 'mix': mix,
+                             'retries': args.retries, 'busy_timeout_ms': args.busy_timeout}
+
+        print_summary(summary)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2, ensure_ascii=False)
+            print(f"Resultado gravado em {args.output}")
+        return 1 if summary['total']['errors'] else 0
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from database import sqlite_path, try_file_lock
+
+# Manutenção em segundo plano: materializa eventos até um horizonte rolante,
+# roda a conclusão automática (tirando essas escritas do GET /planner) e faz o
+# backup agendado do banco. Um lock de arquivo garante um ciclo por vez entre
+# processos; com vários workers também dá para desligar a thread
+# (PLANNER_MAINTENANCE_INTERVAL=0) e rodar `flask --app app maintenance` pelo cron.
+
+DEFAULT_HORIZON_DAYS = 60
+DEFAULT_INTERVAL_SECONDS = 300
+
+
+@contextmanager
+def maintenance_lock(app):
+    """
+    Lock de arquivo ao lado do banco, entre processos: com vários workers (gunicorn -w N)
+    cada um tem seu agendador, mas só um ciclo roda por vez. Rende False se já está em uso.
+    """
+    path = sqlite_path(app)
+    if not path or path == ':memory:':
+        yield True
+        return
+    with try_file_lock(os.path.abspath(path) + '.maintenance.lock') as acquired:
+        yield acquired
+
+
+def run_maintenance(app):
+    """
+    Executa um ciclo de manutenção: gera eventos até hoje + horizonte
+    e marca as aulas já passadas como concluídas. Faz o backup se estiver vencido.
+    Se outro processo já está num ciclo, não faz nada e retorna False.
+    """
+    from blueprints.main import generate_events_for_period, check_auto_completion
+    from backup import run_scheduled_backup
+
+    with maintenance_lock(app) as acquired:
+        if not acquired:
+            return False
+        with app.app_context():
+            horizon = datetime.today() + timedelta(days=app.config['GENERATION_HORIZON_DAYS'])
+            generate_events_for_period(horizon)
+            check_auto_completion()
+            run_scheduled_backup(app)
+    return True
+
+
+class MaintenanceScheduler:
+    """Thread daemon que chama run_maintenance a cada `interval` segundos."""
+
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='planner-maintenance', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                run_maintenance(self.app)
+            except Exception as e:
+                print(f"[Manutenção] Falha ao executar ciclo: {e}")
+            self._stop.wait(self.interval)
+
+
+def init_app(app):
+    app.config.setdefault('GENERATION_HORIZON_DAYS', DEFAULT_HORIZON_DAYS)
+    app.config.setdefault('MAINTENANCE_INTERVAL', DEFAULT_INTERVAL_SECONDS)
+
+    lock = threading.Lock()
+
+    # Inicia no primeiro request, e não no create_app(): assim o processo pai do
+    # reloader (debug) e os comandos de CLI não sobem uma thread de escrita.
+    @app.before_request
+    def start_maintenance_scheduler():
+        if 'maintenance' in app.extensions or app.config['MAINTENANCE_INTERVAL'] <= 0:
+            return
+        with lock:
+            if 'maintenance' not in app.extensions:
+                scheduler = MaintenanceScheduler(app, app.config['MAINTENANCE_INTERVAL'])
+                app.extensions['maintenance'] = scheduler
+                scheduler.start()
+
+    @app.cli.command('maintenance')
+    def maintenance_command():
+        """Gera eventos até o horizonte e roda a conclusão automática (uso em cron)."""
+        if run_maintenance(app):
+            print("Manutenção concluída.")
+        else:
+            print("Outro processo já está executando a manutenção; nada a fazer.")
+
+
+if __name__ == "__main__":
+    from app import create_app
+    if run_maintenance(create_app()):
+        print("Manutenção concluída.")
+    else:
+        print("Outro processo já está executando a manutenção; nada a fazer.")
@@ -0,0 +1,177 @@
+import threading
+import time
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from extensions import db
+
+# Instrumentação opcional (PLANNER_METRICS=1): conta consultas e tempo de banco por
+# request via before/after_cursor_execute, mede a latência por endpoint e expõe tudo
+# em /metrics no formato texto do Prometheus. Com a opção desligada nenhum hook nem
+# rota é registrado, então não há custo nenhum. As métricas são por processo.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_STATEMENTS_SHOWN = 10
+SLOW_STATEMENTS_TRACKED = 200
+
+# Consultas por request acima das quais um aviso é logado (PLANNER_QUERY_BUDGETS
+# sobrescreve/acrescenta, ex. 'main.planner=15,finance.index=10')
+DEFAULT_QUERY_BUDGETS = {
+    'main.planner': 20,
+    'finance.index': 20,
+    'finance.conference': 20,
+    'admin.index': 10,
+}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # endpoint -> [contagens por bucket..., +Inf], soma, total
+        self.latency = {}
+        self.queries = {}
+        self.db_seconds = {}
+        self.budget_exceeded = {}
+        # SQL -> [execuções, tempo total, maior tempo]
+        self.statements = {}
+        # Todas as consultas do engine (dentro ou fora de requests)
+        self.total_queries = 0
+
+    def observe_request(self, endpoint, seconds, queries, db_seconds):
+        with self._lock:
+            buckets, total = self.latency.setdefault(endpoint, ([0] * (len(LATENCY_BUCKETS) + 1), [0.0, 0]))
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            buckets[-1] += 1
+            total[0] += seconds
+            total[1] += 1
+            self.queries[endpoint] = self.queries.get(endpoint, 0) + queries
+            self.db_seconds[endpoint] = self.db_seconds.get(endpoint, 0.0) + db_seconds
+
+    def observe_budget_exceeded(self, endpoint):
+        with self._lock:
+            self.budget_exceeded[endpoint] = self.budget_exceeded.get(endpoint, 0) + 1
+
+    def observe_statement(self, statement, seconds):
+        with self._lock:
+            self.total_queries += 1
+            stats = self.statements.get(statement)
+            if stats is None:
+                if len(self.statements) >= SLOW_STATEMENTS_TRACKED:
+                    # Mantém o conjunto limitado: descarta o que tem o menor pior tempo
+                    fastest = min(self.statements, key=lambda s: self.statements[s][2])
+                    if self.statements[fastest][2] >= seconds:
+                        return
+                    del self.statements[fastest]
+                stats = self.statements[statement] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def render(self):
+        """Métricas no formato texto de exposição do Prometheus (0.0.4)."""
+        lines = []
+        with self._lock:
+            lines.append('# HELP planner_request_duration_seconds Latência das requisições por endpoint.')
+            lines.append('# TYPE planner_request_duration_seconds histogram')
+            for endpoint, (buckets, (total_seconds, count)) in sorted(self.latency.items()):
+                label = f'endpoint="{_escape(endpoint)}"'
+                for bound, value in zip(LATENCY_BUCKETS, buckets):
+                    lines.append(f'planner_request_duration_seconds_bucket{{{label},le="{bound}"}} {value}')
+                lines.append(f'planner_request_duration_seconds_bucket{{{label},le="+Inf"}} {buckets[-1]}')
+                lines.append(f'planner_request_duration_seconds_sum{{{label}}} {total_seconds:.6f}')
+                lines.append(f'planner_request_duration_seconds_count{{{label}}} {count}')
+
+            lines.append('# HELP planner_request_queries_total Consultas SQL executadas pelas requisições.')
+            lines.append('# TYPE planner_request_queries_total counter')
+            for endpoint, value in sorted(self.queries.items()):
+                lines.append(f'planner_request_queries_total{{endpoint="{_escape(endpoint)}"}} {value}')
+
+            lines.append('# HELP planner_request_db_seconds_total Tempo gasto no banco pelas requisições.')
+            lines.append('# TYPE planner_request_db_seconds_total counter')
+            for endpoint, value in sorted(self.db_seconds.items()):
+                lines.append(f'planner_request_db_seconds_total{{endpoint="{_escape(endpoint)}"}} {value:.6f}')
+
+            lines.append('# HELP planner_query_budget_exceeded_total Requisições acima do orçamento de consultas.')
+            lines.append('# TYPE planner_query_budget_exceeded_total counter')
+            for endpoint, value in sorted(self.budget_exceeded.items()):
+                lines.append(f'planner_query_budget_exceeded_total{{endpoint="{_escape(endpoint)}"}} {value}')
+
+            lines.append('# HELP planner_sql_queries_total Consultas SQL executadas pelo processo.')
+            lines.append('# TYPE planner_sql_queries_total counter')
+            lines.append(f'planner_sql_queries_total {self.total_queries}')
+
+            slowest = sorted(self.statements.items(), key=lambda item: item[1][2], reverse=True)[:SLOW_STATEMENTS_SHOWN]
+            lines.append('# HELP planner_sql_statement_max_seconds Pior tempo das consultas mais lentas.')
+            lines.append('# TYPE planner_sql_statement_max_seconds gauge')
+            for statement, (count, total_seconds, max_seconds) in slowest:
+                lines.append(f'planner_sql_statement_max_seconds{{statement="{_escape(statement)}"}} {max_seconds:.6f}')
+            lines.append('# HELP planner_sql_statement_calls_total Execuções das consultas mais lentas.')
+            lines.append('# TYPE planner_sql_statement_calls_total counter')
+            for statement, (count, total_seconds, max_seconds) in slowest:
+                lines.append(f'planner_sql_statement_calls_total{{statement="{_escape(statement)}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    value = ' '.join(str(value).split())[:300]
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def parse_query_budgets(text):
+    """'main.planner=15,finance.index=10' -> {'main.planner': 15, 'finance.index': 10}"""
+    budgets = {}
+    for item in (text or '').split(','):
+        endpoint, _, value = item.partition('=')
+        if endpoint.strip() and value.strip().isdigit():
+            budgets[endpoint.strip()] = int(value)
+    return budgets
+
+
+def init_app(app):
+    app.config.setdefault('METRICS_ENABLED', False)
+    app.config.setdefault('QUERY_BUDGETS', {})
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    registry = MetricsRegistry()
+    app.extensions['metrics'] = registry
+    budgets = app.config['QUERY_BUDGETS']
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        registry.observe_statement(statement, elapsed)
+        if has_request_context() and 'sql_queries' in g:
+            g.sql_queries += 1
+            g.sql_seconds += elapsed
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', after_cursor_execute)
+
+    @app.before_request
+    def start_request_metrics():
+        g.request_started = time.perf_counter()
+        g.sql_queries = 0
+        g.sql_seconds = 0.0
+
+    @app.after_request
+    def record_request_metrics(response):
+        if 'request_started' not in g or request.endpoint == 'metrics':
+            return response
+        endpoint = request.endpoint or 'not_found'
+        registry.observe_request(endpoint, time.perf_counter() - g.request_started, g.sql_queries, g.sql_seconds)
+
+        budget = budgets.get(endpoint)
+        if budget is not None and g.sql_queries > budget:
+            registry.observe_budget_exceeded(endpoint)
+            app.logger.warning("Orçamento de consultas excedido em %s: %d consultas (limite %d, %.1f ms no banco)",
+                               endpoint, g.sql_queries, budget, g.sql_seconds * 1000)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return app.response_class(registry.render(), mimetype='text/plain; version=0.0.4')
@@ -36,6 +36,14 @@ class Turma(db.Model):
     lesson_offset = db.Column(db.Integer, default=0) # Para começar da aula X
     
     total_classes = db.Column(db.Integer, default=40)
+
+    # Marca d'água da geração automática: eventos já materializados até esta data
+    generated_until = db.Column(db.Date, nullable=True)
+
+    # Contadores de progresso materializados (ver progress.py)
+    valid_count = db.Column(db.Integer, default=0)
+    last_event_date = db.Column(db.Date, nullable=True)
+    last_valid_date = db.Column(db.Date, nullable=True)
     
     students = db.relationship('Student', backref='turma', lazy=True, cascade="all, delete-orphan")
 
@@ -48,6 +56,10 @@ class Student(db.Model):
     notes = db.relationship('StudentNote', backref='student', lazy=True, cascade="all, delete-orphan")
 
 class StudentNote(db.Model):
+    # Notas mais recentes por aluno (prévia do roster e paginação do histórico)
+    __table_args__ = (
+        db.Index('ix_student_note_student_date', 'student_id', 'date', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
     date = db.Column(db.DateTime, default=datetime.now)
@@ -59,6 +71,16 @@ class Holiday(db.Model):
     name = db.Column(db.String(100), nullable=False)
 
 class CalendarEvent(db.Model):
+    # Índices das consultas quentes (planner, geração, financeiro e conferência).
+    # O índice único vale só para eventos gerados: extras/reposições podem repetir a data.
+    __table_args__ = (
+        db.Index('ix_calendar_event_turma_date', 'turma_id', 'date'),
+        db.Index('ix_calendar_event_date_status', 'date', 'status'),
+        db.Index('ix_calendar_event_paid_date', 'is_paid', 'date'),
+        db.Index('uq_calendar_event_generated', 'turma_id', 'date', unique=True,
+                 sqlite_where=db.text('turma_id IS NOT NULL AND is_extra = 0 AND is_replacement = 0')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     turma_id = db.Column(db.Integer, db.ForeignKey('turma.id'), nullable=True)
     turma = db.relationship('Turma', backref='calendar_events', lazy=True)
@@ -81,4 +103,22 @@ class CalendarEvent(db.Model):
     
     student_name = db.Column(db.String(100))
     extra_link = db.Column(db.String(500))
-    lesson_title_given = db.Column(db.String(200))
\ No newline at end of file
+    lesson_title_given = db.Column(db.String(200))
+
+class AppMeta(db.Model):
+    # Pares chave/valor de controle interno (marcas d'água, versões, etc.)
+    key = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(200))
+
+    @staticmethod
+    def get(key, default=None):
+        row = db.session.get(AppMeta, key)
+        return row.value if row else default
+
+    @staticmethod
+    def set(key, value):
+        row = db.session.get(AppMeta, key)
+        if row:
+            row.value = value
+        else:
+            db.session.add(AppMeta(key=key, value=value))
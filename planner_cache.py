@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import OrderedDict
+from models import AppMeta
+from versions import get_versions
+
+# Cache (por processo) do HTML renderizado de cada semana do planner. A chave é
+# (início da semana, versão dos dados, faixa de tempo): toda escrita que muda o
+# que o planner mostra chama bump_planner_version() na mesma transação, e a faixa
+# de tempo limita quanto uma entrada pode envelhecer mesmo sem escritas.
+
+DEFAULT_CACHE_SIZE = 64
+DEFAULT_BUCKET_SECONDS = 300
+
+PLANNER_VERSION_KEY = 'planner_version'
+
+
+class FragmentCache:
+    """LRU limitado por número de entradas, com contadores de acerto/erro/despejo."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def bump_planner_version():
+    """Invalida as semanas em cache de todos os processos (commit fica com quem chamou)."""
+    AppMeta.set(PLANNER_VERSION_KEY, str(int(AppMeta.get(PLANNER_VERSION_KEY, '0')) + 1))
+
+
+def get_planner_cache(app):
+    return app.extensions['planner_cache']
+
+
+def week_cache_key(app, week_start):
+    """Início da semana + versões do planner e dos feriados + faixa de tempo atual."""
+    planner_version, holidays_version = get_versions(PLANNER_VERSION_KEY, 'holidays_version')
+    bucket_seconds = app.config['PLANNER_CACHE_BUCKET_SECONDS']
+    bucket = int(time.time() // bucket_seconds) if bucket_seconds > 0 else 0
+    return (week_start, planner_version, holidays_version, bucket)
+
+
+def init_app(app):
+    app.config.setdefault('PLANNER_CACHE_SIZE', DEFAULT_CACHE_SIZE)
+    app.config.setdefault('PLANNER_CACHE_BUCKET_SECONDS', DEFAULT_BUCKET_SECONDS)
+    app.extensions['planner_cache'] = FragmentCache(app.config['PLANNER_CACHE_SIZE'])
@@ -0,0 +1,112 @@
+from sqlalchemy import and_, case, func
+from extensions import db
+from models import Turma, CalendarEvent, AppMeta
+from versions import bump_versions
+
+# Contadores de progresso materializados em Turma (valid_count, last_event_date,
+# last_valid_date). Substituem o "count de aulas válidas" repetido pelo sistema.
+
+PROGRESS_VERSION = '1'
+
+
+def valid_class_filter():
+    """Critério de aula válida: não cancelada/feriado, nem extra, nem reposição."""
+    return and_(
+        CalendarEvent.status.notin_(['cancelled', 'holiday']),
+        CalendarEvent.is_extra == False,
+        CalendarEvent.is_replacement == False
+    )
+
+
+def compute_progress(turma_ids=None):
+    """
+    Recalcula os contadores a partir dos eventos (uma consulta agrupada).
+    last_valid_date usa só o status (inclui extras), como a data final do financeiro.
+    """
+    not_cancelled = CalendarEvent.status.notin_(['cancelled', 'holiday'])
+    query = db.session.query(
+        CalendarEvent.turma_id,
+        func.sum(case((valid_class_filter(), 1), else_=0)),
+        func.max(CalendarEvent.date),
+        func.max(case((not_cancelled, CalendarEvent.date), else_=None))
+    ).filter(CalendarEvent.turma_id != None)
+    if turma_ids is not None:
+        query = query.filter(CalendarEvent.turma_id.in_(turma_ids))
+
+    progress = {}
+    for turma_id, valid_count, last_event_date, last_valid_date in query.group_by(CalendarEvent.turma_id).all():
+        progress[turma_id] = (valid_count or 0, last_event_date, last_valid_date)
+    return progress
+
+
+def refresh_turma_progress(turma_ids):
+    """
+    Atualiza os contadores das turmas informadas dentro da transação atual
+    (o commit fica a cargo de quem chamou). Usado após mudanças de status.
+    Também invalida o ETag das turmas (o progresso exibido mudou).
+    """
+    turma_ids = {tid for tid in turma_ids if tid}
+    if not turma_ids:
+        return
+    db.session.flush()
+    progress = compute_progress(turma_ids)
+    for turma in Turma.query.filter(Turma.id.in_(turma_ids)).all():
+        turma.valid_count, turma.last_event_date, turma.last_valid_date = progress.get(turma.id, (0, None, None))
+    bump_versions('turma', turma_ids)
+
+
+def count_valid_from(turma_ids, start_date, inclusive=True):
+    """
+    Aulas válidas a partir de start_date, por turma. Combinado com valid_count dá a
+    contagem "até a data" lendo só eventos recentes/futuros em vez de todo o histórico.
+    """
+    if not turma_ids:
+        return {}
+    date_filter = CalendarEvent.date >= start_date if inclusive else CalendarEvent.date > start_date
+    return dict(db.session.query(CalendarEvent.turma_id, func.count(CalendarEvent.id)).filter(
+        CalendarEvent.turma_id.in_(turma_ids),
+        date_filter,
+        valid_class_filter()
+    ).group_by(CalendarEvent.turma_id).all())
+
+
+def rebuild_progress(check_only=False):
+    """
+    Confere os contadores de todas as turmas contra uma recontagem completa.
+    Retorna a lista de divergências; se check_only=False, corrige e grava.
+    """
+    progress = compute_progress()
+    mismatches = []
+    for turma in Turma.query.all():
+        expected = progress.get(turma.id, (0, None, None))
+        current = (turma.valid_count or 0, turma.last_event_date, turma.last_valid_date)
+        if current != expected:
+            mismatches.append((turma.id, turma.name, current, expected))
+            if not check_only:
+                turma.valid_count, turma.last_event_date, turma.last_valid_date = expected
+    if not check_only:
+        AppMeta.set('turma_progress_version', PROGRESS_VERSION)
+        db.session.commit()
+    return mismatches
+
+
+def ensure_progress_built():
+    """Na primeira execução (ou após migrar colunas novas) preenche os contadores."""
+    if AppMeta.get('turma_progress_version') != PROGRESS_VERSION:
+        rebuild_progress()
+
+
+def init_app(app):
+    @app.cli.command('rebuild-progress')
+    def rebuild_progress_command():
+        """Confere e reconstrói os contadores de progresso das turmas."""
+        mismatches = rebuild_progress()
+        for turma_id, name, current, expected in mismatches:
+            print(f" -> Turma {turma_id} ({name}): {current} => {expected}")
+        print(f"Contadores reconstruídos. {len(mismatches)} divergência(s) corrigida(s).")
+
+
+if __name__ == "__main__":
+    from app import create_app
+    with create_app().app_context():
+        print(f"{len(rebuild_progress())} divergência(s) corrigida(s).")
@@ -0,0 +1,188 @@
+"""
+Gerador de base sintética para medir os caminhos quentes com volumes realistas.
+
+Cria N cursos com M aulas, T turmas com dias da semana variados, anos de
+histórico de CalendarEvent com status misturados (concluídas, canceladas,
+feriados, pagas ou não), extras e reposições, feriados nacionais, alunos e
+notas. Os eventos futuros são gerados pelo próprio generate_events_for_period.
+A geração é determinística para a mesma --seed.
+
+Uso:
+    python seed_data.py bench.db [--courses 5] [--lessons 40] [--turmas 30] [--years 3]
+                                 [--students 8] [--notes 5] [--seed 42]
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+SCHEDULES = ['0,2', '1,3', '0,2,4', '1,3,5', '4', '5', '0', '0,1,2,3,4', '2,4', '6']
+START_TIMES = ['08:00', '09:30', '14:00', '16:30', '19:00', '20:30']
+
+
+def seed_database(app, courses=5, lessons=40, turmas=30, years=3, students=8, notes=5, seed=42):
+    """
+    Popula o banco do app (que deve estar vazio) e retorna o número de linhas
+    inseridas por tabela.
+    """
+    from sqlalchemy import insert, func
+    from extensions import db, chunked
+    from models import Course, Lesson, Turma, Student, StudentNote, CalendarEvent, Holiday
+    from holiday_calendar import national_holidays, HolidayCalendar, HolidayEntry
+    from blueprints.main import iter_class_dates, generate_events_for_period
+    from progress import rebuild_progress
+
+    rng = random.Random(seed)
+    today = date.today()
+    history_start = today - timedelta(days=365 * years)
+
+    with app.app_context():
+        if db.session.query(func.count(Course.id)).scalar():
+            raise RuntimeError("O banco já tem dados; use um arquivo novo.")
+
+        # Cursos e aulas
+        course_rows = []
+        for c in range(courses):
+            course = Course(name=f'Curso {c + 1}', duration_minutes=rng.choice([60, 90, 120]),
+                            price_per_class=float(rng.choice([25, 30, 40, 50])))
+            db.session.add(course)
+            course_rows.append(course)
+        db.session.flush()
+        db.session.execute(insert(Lesson), [
+            {'course_id': course.id, 'title': f'{course.name} - Aula {i + 1}', 'order': i,
+             'link_presentation': f'docs.example.com/{course.id}/{i}' if i % 2 else None,
+             'link_guide': f'docs.example.com/{course.id}/{i}/guia' if i % 3 == 0 else None}
+            for course in course_rows for i in range(lessons)
+        ])
+
+        # Feriados nacionais do histórico até o horizonte de geração
+        holiday_entries = [(day, name) for year in range(history_start.year, today.year + 2)
+                           for day, name in national_holidays(year)]
+        holiday_entries = list(dict(holiday_entries).items())
+        db.session.execute(insert(Holiday), [{'date': day, 'name': name} for day, name in holiday_entries])
+        holidays = HolidayCalendar(HolidayEntry(None, day, name) for day, name in holiday_entries)
+
+        # Turmas: começos espalhados pelo histórico; algumas já formadas, outras por começar
+        turma_rows = []
+        for t in range(turmas):
+            course = rng.choice(course_rows)
+            schedule = rng.choice(SCHEDULES)
+            start = history_start + timedelta(days=rng.randint(0, (today - history_start).days + 30))
+            turma = Turma(name=f'Turma {t + 1}', course_id=course.id, schedule_days=schedule,
+                          start_time=rng.choice(START_TIMES), start_date=start,
+                          lesson_offset=rng.choice([0, 0, 0, 2, -1]),
+                          total_classes=rng.choice([lessons, lessons * 2, lessons * 4]),
+                          link_whatsapp=f'chat.example.com/{t}')
+            db.session.add(turma)
+            turma_rows.append((turma, course))
+        db.session.flush()
+
+        # Histórico de eventos (até ontem) com status variados
+        event_rows = []
+        for turma, course in turma_rows:
+            valid = 0
+            for day in iter_class_dates(turma.start_date, today - timedelta(days=1), turma.schedule_days, holidays):
+                if valid + turma.lesson_offset >= turma.total_classes:
+                    turma.status = 'graduated'
+                    turma.active = False
+                    break
+                roll = rng.random()
+                status = 'cancelled' if roll < 0.08 else 'completed_auto' if roll < 0.4 else 'completed'
+                if status != 'cancelled':
+                    valid += 1
+                event_rows.append({
+                    'turma_id': turma.id, 'date': day, 'start_time': turma.start_time,
+                    'duration': course.duration_minutes, 'price': course.price_per_class,
+                    'status': status, 'is_paid': rng.random() < 0.85,
+                    'cancelled_at': datetime.combine(day, datetime.min.time()) if status == 'cancelled' else None,
+                })
+
+        # Extras e reposições avulsas espalhadas pelo histórico e pelas próximas semanas
+        for _ in range(max(turmas * 4, 1)):
+            turma, course = rng.choice(turma_rows)
+            day = history_start + timedelta(days=rng.randint(0, (today - history_start).days + 60))
+            is_extra = rng.random() < 0.5
+            event_rows.append({
+                'turma_id': turma.id if is_extra else None, 'date': day, 'start_time': rng.choice(START_TIMES),
+                'duration': 60, 'price': course.price_per_class if is_extra else 0.0,
+                'status': 'scheduled' if day >= today else 'completed', 'is_paid': day < today and rng.random() < 0.7,
+                'is_extra': is_extra, 'is_replacement': not is_extra,
+                'student_name': None if is_extra else f'Aluno {rng.randint(1, 999)}',
+            })
+
+        for chunk in chunked(event_rows, 5000):
+            db.session.execute(insert(CalendarEvent), chunk)
+
+        # Alunos e notas
+        student_ids = []
+        for turma, course in turma_rows:
+            for s in range(students):
+                student = Student(turma_id=turma.id, name=f'Aluno {turma.id}-{s + 1}',
+                                  phone=f'119{rng.randint(10000000, 99999999)}', active=rng.random() < 0.9)
+                db.session.add(student)
+                student_ids.append(student)
+        db.session.flush()
+        note_rows = [
+            {'student_id': student.id, 'content': f'Observação {n + 1} sobre {student.name}',
+             'date': datetime.now() - timedelta(days=rng.randint(0, 365 * years), minutes=rng.randint(0, 1440))}
+            for student in student_ids for n in range(rng.randint(0, notes * 2))
+        ]
+        for chunk in chunked(note_rows, 5000):
+            db.session.execute(insert(StudentNote), chunk)
+        db.session.commit()
+
+        # Contadores de progresso a partir do histórico e eventos futuros pela geração normal
+        rebuild_progress()
+        generate_events_for_period(datetime.today() + timedelta(days=app.config['GENERATION_HORIZON_DAYS']))
+
+        return {
+            'courses': courses,
+            'lessons': courses * lessons,
+            'turmas': turmas,
+            'holidays': len(holiday_entries),
+            'events': db.session.query(func.count(CalendarEvent.id)).scalar(),
+            'students': len(student_ids),
+            'notes': len(note_rows),
+        }
+
+
+def add_arguments(parser):
+    parser.add_argument('--courses', type=int, default=5)
+    parser.add_argument('--lessons', type=int, default=40, help='aulas por curso')
+    parser.add_argument('--turmas', type=int, default=30)
+    parser.add_argument('--years', type=int, default=3, help='anos de histórico de eventos')
+    parser.add_argument('--students', type=int, default=8, help='alunos por turma')
+    parser.add_argument('--notes', type=int, default=5, help='notas por aluno (média)')
+    parser.add_argument('--seed', type=int, default=42)
+
+
+def dataset_options(args):
+    return {name: getattr(args, name) for name in ('courses', 'lessons', 'turmas', 'years', 'students', 'notes', 'seed')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('database', help='arquivo SQLite a criar')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if os.path.exists(args.database):
+        print(f"[Erro] {args.database} já existe; escolha um arquivo novo.")
+        return 1
+
+    from app import create_app
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.abspath(args.database),
+        'MAINTENANCE_INTERVAL': 0,
+        'BACKUP_INTERVAL': 0,
+    })
+    counts = seed_database(app, **dataset_options(args))
+    print("Base sintética criada em", args.database)
+    for table, count in counts.items():
+        print(f"  {table:<10} {count:>8}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
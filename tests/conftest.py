@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app(tmp_path):
+    """App com banco SQLite temporário e sem a manutenção em segundo plano."""
+    from app import create_app
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'agenda.db'),
+        'MAINTENANCE_INTERVAL': 0,
+        'BACKUP_INTERVAL': 0,
+    })
+    with app.app_context():
+        yield app
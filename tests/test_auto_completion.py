@@ -0,0 +1,99 @@
+from datetime import date, datetime, timedelta
+
+from extensions import db
+from models import CalendarEvent
+from blueprints.main import check_auto_completion
+
+TODAY = date(2025, 3, 12)
+
+
+def add_event(day, start_time, status='scheduled'):
+    event = CalendarEvent(date=day, start_time=start_time, duration=60, price=30.0, status=status)
+    db.session.add(event)
+    db.session.commit()
+    return event.id
+
+
+def status_of(event_id):
+    return db.session.get(CalendarEvent, event_id).status
+
+
+def at(hour, minute, second=0):
+    return datetime(TODAY.year, TODAY.month, TODAY.day, hour, minute, second)
+
+
+def test_past_dates_are_completed(app):
+    past = add_event(TODAY - timedelta(days=1), '20:00')
+    old = add_event(TODAY - timedelta(days=40), 'xx')
+    cancelled = add_event(TODAY - timedelta(days=1), '08:00', status='cancelled')
+    future = add_event(TODAY + timedelta(days=1), '08:00')
+
+    check_auto_completion(now=at(9, 0))
+
+    assert status_of(past) == 'completed_auto'
+    assert status_of(old) == 'completed_auto'
+    assert status_of(cancelled) == 'cancelled'
+    assert status_of(future) == 'scheduled'
+
+
+def test_exact_90_minute_boundary(app):
+    on_limit = add_event(TODAY, '14:00')
+    next_minute = add_event(TODAY, '14:01')
+
+    # Exatamente início + 90min ainda não conclui
+    check_auto_completion(now=at(15, 30))
+    assert status_of(on_limit) == 'scheduled'
+
+    # Um minuto depois conclui; a aula das 14:01 agora está exatamente no limite
+    check_auto_completion(now=at(15, 31))
+    assert status_of(on_limit) == 'completed_auto'
+    assert status_of(next_minute) == 'scheduled'
+
+
+def test_boundary_with_seconds(app):
+    started = add_event(TODAY, '14:00')
+    next_minute = add_event(TODAY, '14:01')
+
+    check_auto_completion(now=at(15, 30, 1))
+
+    assert status_of(started) == 'completed_auto'
+    assert status_of(next_minute) == 'scheduled'
+
+
+def test_before_0130_nothing_from_today(app):
+    midnight = add_event(TODAY, '00:00')
+    yesterday = add_event(TODAY - timedelta(days=1), '23:30')
+
+    check_auto_completion(now=at(1, 0))
+
+    assert status_of(midnight) == 'scheduled'
+    assert status_of(yesterday) == 'completed_auto'
+
+
+def test_start_time_formats(app):
+    padded = add_event(TODAY, '09:30')
+    short = add_event(TODAY, '9:5')
+    spaced = add_event(TODAY, ' 09:30')
+    malformed = add_event(TODAY, 'xx:yy')
+    out_of_range = add_event(TODAY, '25:00')
+    no_colon = add_event(TODAY, '0930')
+
+    check_auto_completion(now=at(15, 0))
+
+    assert status_of(padded) == 'completed_auto'
+    assert status_of(short) == 'completed_auto'
+    assert status_of(spaced) == 'completed_auto'
+    assert status_of(malformed) == 'scheduled'
+    assert status_of(out_of_range) == 'scheduled'
+    assert status_of(no_colon) == 'scheduled'
+
+
+def test_same_minute_skips_sweep(app):
+    check_auto_completion(now=at(15, 0, 5))
+    late = add_event(TODAY - timedelta(days=1), '10:00')
+
+    check_auto_completion(now=at(15, 0, 50))
+    assert status_of(late) == 'scheduled'
+
+    check_auto_completion(now=at(15, 1, 0))
+    assert status_of(late) == 'completed_auto'
@@ -0,0 +1,36 @@
+from datetime import date
+
+from app import create_app
+from extensions import db
+from holiday_calendar import add_holidays, get_holiday_calendar
+
+
+def make_app(path):
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(path),
+        'MAINTENANCE_INTERVAL': 0,
+        'BACKUP_INTERVAL': 0,
+    })
+
+
+def test_calendar_cache_is_per_app(tmp_path):
+    first = make_app(tmp_path / 'first.db')
+    second = make_app(tmp_path / 'second.db')
+
+    # Um feriado em cada banco: os dois ficam com holidays_version = 1
+    with first.app_context():
+        add_holidays([(date(2025, 6, 19), 'Primeiro')])
+        db.session.commit()
+        assert date(2025, 6, 19) in get_holiday_calendar()
+
+    with second.app_context():
+        add_holidays([(date(2025, 7, 9), 'Segundo')])
+        db.session.commit()
+        calendar = get_holiday_calendar()
+        assert date(2025, 7, 9) in calendar
+        assert date(2025, 6, 19) not in calendar
+
+    with first.app_context():
+        calendar = get_holiday_calendar()
+        assert date(2025, 6, 19) in calendar
+        assert date(2025, 7, 9) not in calendar
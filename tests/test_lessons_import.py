@@ -0,0 +1,25 @@
+from extensions import db
+from models import Course, Lesson
+from lessons import import_lesson_titles, summarize_import
+
+
+def lesson_titles(course_id):
+    return [title for (title,) in db.session.query(Lesson.title).filter(
+        Lesson.course_id == course_id).order_by(Lesson.order)]
+
+
+def test_import_keeps_repeats_within_the_file(app):
+    course = Course(name='Curso', duration_minutes=60, price_per_class=30.0)
+    db.session.add(course)
+    db.session.flush()
+    db.session.add(Lesson(course_id=course.id, title='Introdução', order=0))
+    db.session.commit()
+
+    titles = ['Introdução', 'Aula 1', 'Revisão', 'Aula 2', 'Revisão', 'Aula prática', 'Aula prática']
+    progress = import_lesson_titles(course.id, titles, chunk_size=3)
+    db.session.commit()
+
+    # Só o título que o curso já tinha é ignorado; as repetições do arquivo entram na ordem
+    assert summarize_import(progress) == (6, 1)
+    assert lesson_titles(course.id) == ['Introdução', 'Aula 1', 'Revisão', 'Aula 2', 'Revisão',
+                                        'Aula prática', 'Aula prática']
@@ -0,0 +1,15 @@
+import os
+
+from database import sqlite_path, try_file_lock
+from maintenance import run_maintenance
+
+
+def test_cycle_is_skipped_while_another_process_holds_the_lock(app):
+    lock_path = os.path.abspath(sqlite_path(app)) + '.maintenance.lock'
+
+    # Simula outro worker no meio de um ciclo
+    with try_file_lock(lock_path) as acquired:
+        assert acquired
+        assert run_maintenance(app) is False
+
+    assert run_maintenance(app) is True
@@ -0,0 +1,42 @@
+from datetime import date
+
+from sqlalchemy import text
+
+from app import create_app
+from extensions import db
+from models import AppMeta, CalendarEvent, Course, Turma
+from update_db import (FAILED_INDEXES_KEY, read_schema_fingerprint, schema_fingerprint,
+                       update_database)
+
+
+def test_failed_unique_index_is_recorded_and_not_retried_on_boot(app, tmp_path, capsys):
+    course = Course(name='Curso', duration_minutes=60, price_per_class=30.0)
+    db.session.add(course)
+    db.session.flush()
+    turma = Turma(name='Turma', course_id=course.id, schedule_days='0', start_time='10:00')
+    db.session.add(turma)
+    db.session.flush()
+
+    # Banco antigo: sem o índice único e com dois eventos gerados no mesmo dia
+    db.session.execute(text('DROP INDEX uq_calendar_event_generated'))
+    for _ in range(2):
+        db.session.add(CalendarEvent(turma_id=turma.id, date=date(2025, 3, 10), start_time='10:00'))
+    db.session.commit()
+
+    assert update_database(app) is False
+    output = capsys.readouterr().out
+    assert 'uq_calendar_event_generated' in output
+    assert f'2 linhas em calendar_event com turma_id={turma.id}, date=2025-03-10' in output
+
+    # O índice que falhou fica registrado e o fingerprint é gravado mesmo assim
+    assert AppMeta.get(FAILED_INDEXES_KEY) == 'uq_calendar_event_generated'
+    assert read_schema_fingerprint() == schema_fingerprint()
+
+    # Próximos boots não retentam a migração nem geram backups pre-migration
+    create_app({
+        'SQLALCHEMY_DATABASE_URI': app.config['SQLALCHEMY_DATABASE_URI'],
+        'MAINTENANCE_INTERVAL': 0,
+        'BACKUP_INTERVAL': 0,
+    })
+    assert 'Criando índice' not in capsys.readouterr().out
+    assert not list(tmp_path.glob('*.bak'))
@@ -1,8 +1,64 @@
 import os
-import shutil
-from datetime import datetime
+import hashlib
 from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateTable, CreateIndex
 from extensions import db
+from database import sqlite_path
+from backup import backup_database
+
+# Impressão digital do esquema: hash do DDL gerado a partir do db.metadata, guardado
+# em AppMeta. Se o banco já está na versão dos models, o create_app() pula o
+# create_all() e toda a inspeção abaixo.
+SCHEMA_FINGERPRINT_KEY = 'schema_fingerprint'
+# Índices que não puderam ser criados (ex. único com dados duplicados), separados por vírgula.
+# O fingerprint é gravado mesmo assim, para o boot não repetir a tentativa (e o backup) a
+# cada início; depois de corrigir os dados, `python update_db.py` tenta de novo.
+FAILED_INDEXES_KEY = 'schema_failed_indexes'
+
+
+def schema_fingerprint():
+    """Hash (sha256) do DDL das tabelas e índices declarados nos models."""
+    dialect = db.engine.dialect
+    digest = hashlib.sha256()
+    for table_name in sorted(db.metadata.tables):
+        table = db.metadata.tables[table_name]
+        digest.update(str(CreateTable(table).compile(dialect=dialect)).encode())
+        for index in sorted(table.indexes, key=lambda i: i.name or ''):
+            digest.update(str(CreateIndex(index).compile(dialect=dialect)).encode())
+    return digest.hexdigest()
+
+
+def read_schema_fingerprint():
+    """Fingerprint gravado no banco (None se ainda não existe a tabela app_meta)."""
+    try:
+        return db.session.execute(
+            text("SELECT value FROM app_meta WHERE key = :key"), {'key': SCHEMA_FINGERPRINT_KEY}
+        ).scalar()
+    except OperationalError:
+        db.session.rollback()
+        return None
+
+
+def save_schema_fingerprint(fingerprint=None):
+    from models import AppMeta
+    AppMeta.set(SCHEMA_FINGERPRINT_KEY, fingerprint or schema_fingerprint())
+    db.session.commit()
+
+
+def find_index_conflicts(table_name, index, limit=10):
+    """Grupos de valores que impedem um índice único: [(valores..., quantidade)]."""
+    dialect = db.engine.dialect
+    columns = ', '.join(dialect.identifier_preparer.quote(c.name) for c in index.columns)
+    where = index.dialect_options['sqlite'].get('where')
+    where_sql = ""
+    if where is not None:
+        where_sql = f" WHERE {where.compile(dialect=dialect, compile_kwargs={'literal_binds': True})}"
+    return db.session.execute(text(
+        f"SELECT {columns}, COUNT(*) FROM {table_name}{where_sql} "
+        f"GROUP BY {columns} HAVING COUNT(*) > 1 LIMIT {int(limit)}"
+    )).all()
+
 
 def update_database(app=None):
     print("Iniciando rotina de verificação do Banco de Dados...")
@@ -13,16 +69,17 @@ def update_database(app=None):
     if app is None:
         from app import create_app
         app = create_app()
-        
-    db_path = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
     
     with app.app_context():
         inspector = inspect(db.engine)
         existing_tables = inspector.get_table_names()
         metadata_tables = db.metadata.tables
         
-        # Lista para guardar as alterações necessárias
+        # Listas para guardar as alterações necessárias
         alter_queries = []
+        missing_indexes = []
+        failed = False
+        failed_indexes = []
         
         # 2. Compara colunas das tabelas nos models com o banco atual
         for table_name, table in metadata_tables.items():
@@ -59,16 +116,24 @@ def update_database(app=None):
                         
                         stmt = f"ALTER TABLE {table_name} ADD COLUMN {column.name} {col_type}{default_clause};"
                         alter_queries.append((table_name, column.name, stmt))
+
+                # Índices declarados nos models (__table_args__) que ainda não existem no banco
+                existing_indexes = {i['name'] for i in inspector.get_indexes(table_name)}
+                for index in table.indexes:
+                    if index.name not in existing_indexes:
+                        missing_indexes.append((table_name, index))
         
-        # 3. Se houver colunas para adicionar, faz o backup e atualiza o esquema
-        if alter_queries:
-            print(f"Foram encontradas {len(alter_queries)} coluna(s) ausente(s).")
+        # 3. Se houver colunas/índices para adicionar, faz o backup e atualiza o esquema
+        if alter_queries or missing_indexes:
+            if alter_queries:
+                print(f"Foram encontradas {len(alter_queries)} coluna(s) ausente(s).")
+            if missing_indexes:
+                print(f"Foram encontrados {len(missing_indexes)} índice(s) ausente(s).")
             
-            # Backup de segurança
-            if os.path.exists(db_path):
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                backup_path = f"{db_path}.{timestamp}.bak"
-                shutil.copy2(db_path, backup_path)
+            # Backup de segurança antes de alterar tabelas (API de backup do SQLite, verificado
+            # com integrity_check). Só índices: CREATE INDEX é atômico e não altera dados.
+            if alter_queries and sqlite_path(app) and os.path.exists(sqlite_path(app)):
+                backup_path = backup_database(app, tag='pre-migration')
                 print(f"[Backup] Cópia de segurança criada em: {backup_path}")
             
             # Aplica as novas colunas
@@ -79,10 +144,45 @@ def update_database(app=None):
                         conn.execute(text(stmt))
                     except Exception as e:
                         print(f"[Erro] Falha ao alterar a tabela {table_name}: {e}")
+                        failed = True
                 conn.commit()
+
+            # Aplica os índices (depois das colunas, pois podem depender delas)
+            added_indexes = []
+            for table_name, index in missing_indexes:
+                try:
+                    print(f" -> Criando índice '{index.name}' na tabela '{table_name}'...")
+                    with db.engine.begin() as conn:
+                        index.create(bind=conn)
+                    added_indexes.append(index.name)
+                except Exception as e:
+                    # Ex.: índice único com dados duplicados já existentes
+                    print(f"[Erro] Falha ao criar o índice {index.name}: {e}")
+                    failed_indexes.append(index.name)
+                    if index.unique:
+                        for row in find_index_conflicts(table_name, index):
+                            *values, count = row
+                            print(f"    {count} linhas em {table_name} com "
+                                  f"{', '.join(f'{c.name}={v}' for c, v in zip(index.columns, values))}")
+            if added_indexes:
+                print(f"Índices adicionados: {', '.join(added_indexes)}")
+            if failed_indexes:
+                print(f"[Aviso] Índices não criados: {', '.join(failed_indexes)}. "
+                      "Corrija as linhas acima e rode `python update_db.py` para tentar de novo.")
             print("\nAtualização de estrutura concluída com sucesso!")
         else:
-            print("\nO banco de dados já está totalmente atualizado com suas tabelas e colunas.")
+            print("\nO banco de dados já está totalmente atualizado com suas tabelas, colunas e índices.")
+
+        from models import AppMeta
+        AppMeta.set(FAILED_INDEXES_KEY, ','.join(failed_indexes))
+        db.session.commit()
+
+        # Colunas que falharam fazem a verificação rodar de novo no próximo boot; índices
+        # que falharam ficam registrados em FAILED_INDEXES_KEY e não são retentados no boot
+        if not failed:
+            save_schema_fingerprint()
+        return not failed and not failed_indexes
 
 if __name__ == "__main__":
+    # Execução manual: sempre faz a verificação completa, mesmo com o fingerprint em dia
     update_database()
\ No newline at end of file
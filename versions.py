@@ -0,0 +1,60 @@
+import hashlib
+from flask import request, jsonify, current_app
+from extensions import db, chunked
+from models import AppMeta
+
+# Versões por entidade para GET condicional (ETag/304) nas APIs JSON do admin.
+# Ficam em AppMeta ('version:turma:12', 'version:course:3', 'version:roster:12',
+# 'version:student:40'): toda rota de escrita chama bump_versions() na mesma
+# transação, e as APIs montam o ETag só com essas chaves, sem consultar as
+# tabelas das entidades quando o cliente já tem a versão atual.
+
+
+def version_key(kind, entity_id):
+    return f"version:{kind}:{entity_id}"
+
+
+def bump_versions(kind, entity_ids):
+    """Incrementa a versão das entidades informadas (commit fica com quem chamou)."""
+    keys = {version_key(kind, entity_id) for entity_id in entity_ids if entity_id}
+    if not keys:
+        return
+    rows = {}
+    for chunk in chunked(keys):
+        rows.update((row.key, row) for row in AppMeta.query.filter(AppMeta.key.in_(chunk)))
+    for key in keys:
+        if key in rows:
+            rows[key].value = str(int(rows[key].value or 0) + 1)
+        else:
+            db.session.add(AppMeta(key=key, value='1'))
+
+
+def bump_version(kind, entity_id):
+    bump_versions(kind, [entity_id])
+
+
+def get_versions(*keys):
+    """Valores atuais das chaves (AppMeta), numa consulta; chaves ausentes valem '0'."""
+    found = {}
+    for chunk in chunked(set(keys)):
+        found.update(db.session.query(AppMeta.key, AppMeta.value).filter(AppMeta.key.in_(chunk)).all())
+    return [found.get(key) or '0' for key in keys]
+
+
+def make_etag(*parts):
+    """ETag forte a partir das versões e parâmetros que definem a resposta."""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()[:24]
+
+
+def conditional_json(etag, build):
+    """
+    Responde 304 se o If-None-Match bate com o ETag; senão chama build() e
+    serializa o resultado. O navegador sempre revalida (no-cache).
+    """
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
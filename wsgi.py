@@ -0,0 +1,6 @@
+# Ponto de entrada de produção (WSGI). Configuração via variáveis de ambiente PLANNER_*.
+# Ex.: waitress-serve --threads 8 wsgi:app
+#      gunicorn -w 4 --threads 4 wsgi:app
+from app import create_app
+
+app = create_app()